@@ -50,13 +50,10 @@ def main():
         print(ICON)
         print(f"Hello {user}! This is the Monkey programming language!")
         print("Feel free to type in commands.")
-        if args.mode != "interp":
-            repl.start(mode=args.mode)
-        else:
-            repl.start()
+        repl.start(mode=args.mode)
     else:
         with open(args.file, "r") as f:
-            repl.start(rin=f)
+            repl.start(rin=f, mode=args.mode, path=args.file)
     return
 
 
@@ -1,10 +1,12 @@
 from .ast import ast
 from .code import code
-from .compiler import compiler, symbols
+from .compiler import compiler, serial, symbols
 from .eval import eval
+from .fold import fold
 from .lexer import lexer
 from .obj import env, obj, builtin
 from .parser import parser
 from .repl import repl
+from .session import cache, session
 from .token import token
 from .vm import vm
@@ -5,6 +5,8 @@ from typing import Dict, List
 from ..token import token
 
 
+# Nodes with a token also record offset, where that token starts in the source
+# (-1 if unknown). It doesn't take part in comparisons.
 @dataclass(eq=True, frozen=True)
 class Node(ABC):
     @property
@@ -57,6 +59,7 @@ class Program(Node):
 class Identifier(Expression):
     tok: token.Token
     value: str
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -75,6 +78,7 @@ class LetStatement(Statement):
     tok: token.Token
     name: Identifier
     value: Expression
+    offset: int = field(default=-1, compare=False)
 
     def statement_node(self) -> None:
         return
@@ -99,6 +103,7 @@ class LetStatement(Statement):
 class ReturnStatement(Statement):
     tok: token.Token
     value: Expression
+    offset: int = field(default=-1, compare=False)
 
     def statement_node(self) -> None:
         return
@@ -121,6 +126,7 @@ class ReturnStatement(Statement):
 class ExpressionStatement(Statement):
     tok: token.Token
     expression: Expression
+    offset: int = field(default=-1, compare=False)
 
     def statement_node(self) -> None:
         return
@@ -141,6 +147,7 @@ class ExpressionStatement(Statement):
 class IntegerLiteral(Expression):
     tok: token.Token
     value: int
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -158,6 +165,7 @@ class IntegerLiteral(Expression):
 class StringLiteral(Expression):
     tok: token.Token
     value: str
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -175,6 +183,7 @@ class StringLiteral(Expression):
 class ArrayLiteral(Expression):
     tok: token.Token
     elements: List[Expression] | None
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -196,6 +205,7 @@ class ArrayLiteral(Expression):
 class HashLiteral(Expression):
     tok: token.Token
     pairs: Dict[Expression | None, Expression | None]
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -217,6 +227,7 @@ class HashLiteral(Expression):
 class Boolean(Expression):
     tok: token.Token
     value: bool
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -235,6 +246,7 @@ class PrefixExpression(Expression):
     tok: token.Token
     operator: str
     right: Expression
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -254,6 +266,7 @@ class InfixExpression(Expression):
     left: Expression
     operator: str
     right: Expression
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -273,6 +286,7 @@ class InfixExpression(Expression):
 class BlockStatement(Statement):
     tok: token.Token
     statements: List[Statement]
+    offset: int = field(default=-1, compare=False)
 
     def statement_node(self) -> None:
         return
@@ -292,6 +306,7 @@ class IfExpression(Expression):
     condition: Expression | None
     consequence: BlockStatement | None
     alternative: BlockStatement | None
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -317,6 +332,7 @@ class FunctionLiteral(Expression):
     tok: token.Token
     parameters: List[Identifier] | None
     body: BlockStatement | None
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -342,6 +358,7 @@ class CallExpression(Expression):
     tok: token.Token
     function: Expression | None
     arguements: List[Expression] | None
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -367,6 +384,7 @@ class IndexExpression(Expression):
     tok: token.Token
     left: Expression | None
     index: Expression | None
+    offset: int = field(default=-1, compare=False)
 
     def expression_node(self) -> None:
         return
@@ -1,5 +1,7 @@
+from bisect import bisect_right
 from dataclasses import dataclass
 from enum import Enum
+from typing import Any, Sequence
 
 
 class OpCode(Enum):
@@ -32,6 +34,13 @@ class OpCode(Enum):
     GetBuiltIn = b"\x1b"
     Closure = b"\x1c"
     GetFree = b"\x1d"
+    GetLocalGetLocal = b"\x1e"
+    PConstantAdd = b"\x1f"
+    PConstantSub = b"\x20"
+    GetLocalPConstantEqual = b"\x21"
+    EqualJumpNT = b"\x22"
+    TailCall = b"\x23"
+    CurrentClosure = b"\x24"
 
 
 @dataclass
@@ -70,8 +79,39 @@ OpDefs: dict[OpCode, Definition] = {
     OpCode.GetBuiltIn: Definition(OpCode.GetBuiltIn.name, [1]),
     OpCode.Closure: Definition(OpCode.Closure.name, [2, 1]),
     OpCode.GetFree: Definition(OpCode.GetFree.name, [1]),
+    OpCode.GetLocalGetLocal: Definition(OpCode.GetLocalGetLocal.name, [1, 1]),
+    OpCode.PConstantAdd: Definition(OpCode.PConstantAdd.name, [2]),
+    OpCode.PConstantSub: Definition(OpCode.PConstantSub.name, [2]),
+    OpCode.GetLocalPConstantEqual: Definition(
+        OpCode.GetLocalPConstantEqual.name, [1, 2]
+    ),
+    OpCode.EqualJumpNT: Definition(OpCode.EqualJumpNT.name, [2]),
+    OpCode.TailCall: Definition(OpCode.TailCall.name, [1]),
+    OpCode.CurrentClosure: Definition(OpCode.CurrentClosure.name, []),
 }
 
+# Opcodes whose first operand is a jump target.
+Jumps: set[OpCode] = {OpCode.Jump, OpCode.JumpNT, OpCode.EqualJumpNT}
+
+
+# Plain integer value of each OpCode, as found in decoded instructions. Kept as
+# class attributes rather than an IntEnum so that dispatch compares bare ints.
+Op = type("Op", (), {op.name: op.value[0] for op in OpCode})
+
+OperandWidths: dict[int, list[int]] = {
+    op.value[0]: d.operand_widths for op, d in OpDefs.items()
+}
+
+JumpOps: set[int] = {op.value[0] for op in Jumps}
+
+# Opcodes that get an inline cache cell when decoded.
+CallOps: set[int] = {OpCode.Call.value[0], OpCode.TailCall.value[0]}
+
+# Opcodes whose operand is a globals index.
+GlobalOps: set[int] = {OpCode.SetGlobal.value[0], OpCode.GetGlobal.value[0]}
+
+DecodedInstruction = tuple[Any, ...]
+
 
 def instructions_to_string(insts: bytes) -> str:
     string = ""
@@ -96,3 +136,52 @@ def make(op: OpCode, *operands: int) -> bytes:
     for operand, n_bytes in zip(operands, OpDefs[op].operand_widths):
         instruction += operand.to_bytes(n_bytes, "big")
     return instruction
+
+
+def decode(insts: bytes) -> list[DecodedInstruction]:
+    """Decode instructions into (opcode, *operands) tuples.
+
+    Jump operands are remapped from byte offsets to indices in the returned list.
+    Calls get a trailing one-item list, an inline cache for the VM to fill.
+    """
+    decoded: list[DecodedInstruction] = []
+    index: dict[int, int] = {}
+    ip = 0
+    while ip < len(insts):
+        index[ip] = len(decoded)
+        op = insts[ip]
+        ip += 1
+        operands = []
+        for width in OperandWidths[op]:
+            operands.append(int.from_bytes(insts[ip : ip + width], "big"))
+            ip += width
+        if op in CallOps:
+            operands.append([None])
+        decoded.append((op, *operands))
+    index[ip] = len(decoded)
+
+    for i, (op, *operands) in enumerate(decoded):
+        if op in JumpOps:
+            decoded[i] = (op, index[operands[0]], *operands[1:])
+    return decoded
+
+
+def instruction_position(insts: bytes, index: int) -> int:
+    """Byte offset of the index-th instruction, i.e. the inverse of decode."""
+    ip = 0
+    for _ in range(index):
+        ip += 1 + sum(OperandWidths[insts[ip]])
+    return ip
+
+
+def line_offset(lines: Sequence[int], ip: int) -> int:
+    """Look up the source offset of the instruction at byte offset ip.
+
+    lines is a line table: flat (ip, offset) pairs in increasing ip order, each
+    giving the source offset of the instructions from ip up to the next pair.
+    Returns -1 for instructions the table doesn't cover.
+    """
+    k = bisect_right(lines[::2], ip)
+    if k == 0:
+        return -1
+    return lines[2 * k - 1]
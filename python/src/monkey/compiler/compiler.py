@@ -1,21 +1,92 @@
+from array import array
 from dataclasses import dataclass, field
 from pprint import pformat
-from typing import Optional
+from typing import Final, Optional
 
 from ..ast import ast
 from ..code import code
 from ..obj import obj, builtin
-from . import symbols
+from . import optimize, symbols
 
+# Bump whenever the emitted bytecode changes, so cached .mkc files are rebuilt.
+VERSION: Final[int] = 2
 
-def new_error(msg: str) -> obj.Error:
-    return obj.Error(msg)
+
+def new_error(msg: str, offset: int = -1) -> obj.Error:
+    return obj.Error(msg, offset)
+
+
+def new_line_table() -> array:
+    return array("L")
+
+
+def constant_key(c: obj.Object) -> tuple:
+    """Interning key for the constant pool: equal keys may share one slot.
+
+    A function's key includes its line table and source, so identical functions
+    only share a slot when they come from the same place, as when a snippet is
+    rerun.
+    """
+    match c:
+        case obj.CompiledFunction():
+            return (
+                type(c),
+                bytes(c.instructions),
+                c.n_locals,
+                c.n_params,
+                c.lines.tobytes(),
+                c.source,
+            )
+        case obj.Integer() | obj.String():
+            return (type(c), c.value)
+        case _:
+            return (type(c), id(c))
 
 
 @dataclass
 class Bytecode:
     instructions: bytearray
     constants: list[obj.Object]
+    n_globals: int = 0
+    # Maps instructions to source offsets, see code.line_offset.
+    lines: array = field(default_factory=new_line_table)
+    # The source lines points into, see CompiledFunction.source.
+    source: object = field(default=None, compare=False)
+    _main_fn: obj.CompiledFunction | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _globals_size: int | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def main_fn(self) -> obj.CompiledFunction:
+        """The top-level program as a function, decoded once however often run."""
+        if self._main_fn is None:
+            self._main_fn = obj.CompiledFunction(
+                self.instructions, 0, 0, self.lines, self.source
+            )
+        return self._main_fn
+
+    @property
+    def globals_size(self) -> int:
+        """How many globals the program needs.
+
+        Bytecode built without n_globals is scanned for the highest global it
+        sets or gets, in the program and in every function it can call.
+        """
+        if self._globals_size is None:
+            size = self.n_globals
+            if size == 0:
+                fns = [self.main_fn] + [
+                    c for c in self.constants if isinstance(c, obj.CompiledFunction)
+                ]
+                for fn in fns:
+                    for op, *operands in fn.decoded:
+                        if op in code.GlobalOps:
+                            size = max(size, operands[0] + 1)
+            self._globals_size = size
+        return self._globals_size
 
 
 @dataclass
@@ -29,6 +100,7 @@ class CompilationScope:
     instructions: bytearray = field(default_factory=bytearray)
     last_inst: EmittedInstruction | None = None
     prev_inst: EmittedInstruction | None = None
+    lines: array = field(default_factory=new_line_table)
 
 
 class Compiler:
@@ -36,11 +108,26 @@ class Compiler:
         self,
         constants: Optional[list[obj.Object]] = None,
         table: Optional[symbols.Table] = None,
+        superinstructions: bool = False,
+        optimize: bool = False,
+        constant_index: Optional[dict[tuple, int]] = None,
+        source: object = None,
     ) -> None:
+        self.superinstructions: bool = superinstructions
+        self.optimize: bool = optimize
         if constants is not None:
             self.constants: list[obj.Object] = constants
         else:
             self.constants = []
+        # Maps constant_key to a slot in constants. Whoever shares constants
+        # between compilers (e.g. a Session) can pass the index along with
+        # them; otherwise the given constants are indexed here, so later
+        # lines reuse their slots.
+        if constant_index is None:
+            constant_index = {}
+            for i, c in enumerate(self.constants):
+                constant_index.setdefault(constant_key(c), i)
+        self.constant_index: dict[tuple, int] = constant_index
         self.op_dict: dict[str, code.OpCode] = {
             "+": code.OpCode.Add,
             "-": code.OpCode.Sub,
@@ -66,6 +153,10 @@ class Compiler:
         self.scopes: list[CompilationScope] = [self.main_scope]
         self.scope_ptr: int = 0
         self._errors: list[obj.Error] = []
+        # Source offset of the node being compiled, recorded in line tables.
+        self.offset: int = -1
+        # The source being compiled, which line tables point into.
+        self.source: object = source
 
     @property
     def errors(self):
@@ -111,13 +202,27 @@ class Compiler:
     def compile(self, node: ast.Node) -> None:
         if len(self._errors) > 0:
             return
+        outer_offset = self.offset
+        if getattr(node, "offset", -1) >= 0:
+            self.offset = node.offset
+        self.compile_node(node)
+        self.offset = outer_offset
+
+    def compile_node(self, node: ast.Node) -> None:
         match node:
             case ast.Program():
                 for stmt in node.statements:
                     self.compile(stmt)
             case ast.LetStatement():
                 sym = self.sym_table.define(node.name.value)
-                self.compile(node.value)
+                if sym.scope == symbols.LOCAL_SCOPE and isinstance(
+                    node.value, ast.FunctionLiteral
+                ):
+                    # A local closure can't capture its own slot, which is only
+                    # set once the closure exists, so it refers to itself.
+                    self.compile_function(node.value, node.name.value)
+                else:
+                    self.compile(node.value)
                 if sym.scope == symbols.GLOBAL_SCOPE:
                     self.emit(code.OpCode.SetGlobal, sym.index)
                 else:
@@ -141,7 +246,7 @@ class Compiler:
                         self.compile(node.right)
                 self.emit(self.op_dict[op])
             case ast.IntegerLiteral():
-                integer = obj.Integer(node.value)
+                integer = obj.new_integer(node.value)
                 ident = self.add_constant(integer)
                 self.emit(code.OpCode.PConstant, ident)
             case ast.StringLiteral():
@@ -179,7 +284,9 @@ class Compiler:
             case ast.Identifier():
                 sym = self.sym_table.resolve(node.value)
                 if sym is None:
-                    self.errors.append(new_error(f"unknown identifier: {node.value}"))
+                    self.errors.append(
+                        new_error(f"unknown identifier: {node.value}", self.offset)
+                    )
                 else:
                     self.load_symbol(sym)
             case ast.BlockStatement():
@@ -209,33 +316,12 @@ class Compiler:
                             (
                                 f"failed to compile node:\n{pformat(node)}."
                                 " Conditional missing condition or consequence."
-                            )
+                            ),
+                            self.offset,
                         )
                     )
             case ast.FunctionLiteral():
-                self.enter_scope()
-                params = node.parameters
-                if params:
-                    for param in params:
-                        self.sym_table.define(param.value)
-                if node.body and len(node.body.statements) > 0:
-                    self.compile(node.body)
-                else:
-                    self.emit(code.OpCode.Return)  # empty body same as return
-                if self.last_inst and self.last_inst.opcode == code.OpCode.Pop:
-                    self.remove_last_instruction()  # implict returns
-                    self.emit(code.OpCode.ReturnValue)
-                n_locals = self.sym_table.n_def
-                free_sym = self.sym_table.free_sym
-                insts = self.leave_scope()
-                if params:
-                    n_params = len(params)
-                else:
-                    n_params = 0
-                for sym in free_sym:
-                    self.load_symbol(sym)
-                fn = obj.CompiledFunction(insts, n_locals, n_params)
-                self.emit(code.OpCode.Closure, self.add_constant(fn), len(free_sym))
+                self.compile_function(node)
             case ast.ReturnStatement():
                 self.compile(node.value)
                 self.emit(code.OpCode.ReturnValue)
@@ -252,13 +338,50 @@ class Compiler:
                     self.emit(code.OpCode.Call, 0)
             case _:
                 self._errors.append(
-                    new_error(f"failed to compile node:\n{pformat(node)}")
+                    new_error(f"failed to compile node:\n{pformat(node)}", self.offset)
                 )
         return None
 
+    def compile_function(
+        self, node: ast.FunctionLiteral, name: str | None = None
+    ) -> None:
+        self.enter_scope()
+        if name is not None:
+            self.sym_table.define_function_name(name)
+        params = node.parameters
+        if params:
+            for param in params:
+                self.sym_table.define(param.value)
+        if node.body and len(node.body.statements) > 0:
+            self.compile(node.body)
+        else:
+            self.emit(code.OpCode.Return)  # empty body same as return
+        if self.last_inst and self.last_inst.opcode == code.OpCode.Pop:
+            self.remove_last_instruction()  # implict returns
+            self.emit(code.OpCode.ReturnValue)
+        n_locals = self.sym_table.n_def
+        free_sym = self.sym_table.free_sym
+        lines = self.scopes[self.scope_ptr].lines
+        insts = self.finalize(
+            optimize.mark_tail_calls(self.leave_scope(), lines), lines
+        )
+        if params:
+            n_params = len(params)
+        else:
+            n_params = 0
+        for sym in free_sym:
+            self.load_symbol(sym)
+        fn = obj.CompiledFunction(insts, n_locals, n_params, lines, self.source)
+        self.emit(code.OpCode.Closure, self.add_constant(fn), len(free_sym))
+
     def add_constant(self, c: obj.Object) -> int:
-        self.constants.append(c)
-        return len(self.constants) - 1
+        key = constant_key(c)
+        ident = self.constant_index.get(key)
+        if ident is None:
+            self.constants.append(c)
+            ident = len(self.constants) - 1
+            self.constant_index[key] = ident
+        return ident
 
     def add_instruction(self, ins: bytes) -> int:
         pos = len(self.instructions)
@@ -282,11 +405,18 @@ class Compiler:
             pos = self.last_inst.position
             self.instructions = self.instructions[:pos]
             self.last_inst = self.prev_inst
+            lines = self.scopes[self.scope_ptr].lines
+            while lines and lines[-2] >= pos:
+                del lines[-2:]
 
     def emit(self, op: code.OpCode, *operands: int) -> int:
         ins = code.make(op, *operands)
         pos = self.add_instruction(ins)
         self.set_last_instruction(op, pos)
+        if self.offset >= 0:
+            lines = self.scopes[self.scope_ptr].lines
+            if not lines or lines[-1] != self.offset:
+                lines.extend((pos, self.offset))
         return pos
 
     def set_last_instruction(self, op: code.OpCode, pos: int) -> None:
@@ -303,10 +433,26 @@ class Compiler:
                 self.emit(code.OpCode.GetBuiltIn, sym.index)
             case symbols.FREE_SCOPE:
                 self.emit(code.OpCode.GetFree, sym.index)
+            case symbols.FUNCTION_SCOPE:
+                self.emit(code.OpCode.CurrentClosure)
+
+    def finalize(self, insts: bytearray, lines: array | None = None) -> bytearray:
+        if self.optimize:
+            insts = optimize.optimize_jumps(insts, lines)
+        if self.superinstructions:
+            insts = optimize.fuse_superinstructions(insts, lines)
+        return insts
 
     @property
     def bytecode(self) -> Bytecode:
-        return Bytecode(self.instructions, self.constants)
+        lines = array("L", self.main_scope.lines)
+        return Bytecode(
+            self.finalize(self.instructions, lines),
+            self.constants,
+            self.sym_table.n_def,
+            lines,
+            self.source,
+        )
 
     @property
     def error_str(self):
@@ -0,0 +1,245 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+
+from ..code import code
+
+
+@dataclass
+class Instruction:
+    opcode: code.OpCode
+    operands: list[int]
+    position: int
+
+
+SuperInstructions: list[tuple[tuple[code.OpCode, ...], code.OpCode]] = [
+    (
+        (code.OpCode.GetLocal, code.OpCode.PConstant, code.OpCode.Equal),
+        code.OpCode.GetLocalPConstantEqual,
+    ),
+    ((code.OpCode.GetLocal, code.OpCode.GetLocal), code.OpCode.GetLocalGetLocal),
+    ((code.OpCode.PConstant, code.OpCode.Add), code.OpCode.PConstantAdd),
+    ((code.OpCode.PConstant, code.OpCode.Sub), code.OpCode.PConstantSub),
+    ((code.OpCode.Equal, code.OpCode.JumpNT), code.OpCode.EqualJumpNT),
+]
+
+
+def read_instructions(insts: bytes) -> list[Instruction]:
+    instructions = []
+    ip = 0
+    while ip < len(insts):
+        op = code.OpCode(insts[ip].to_bytes(1, "big"))
+        pos = ip
+        ip += 1
+        operands = []
+        for width in code.OpDefs[op].operand_widths:
+            operands.append(int.from_bytes(insts[ip : ip + width], "big"))
+            ip += width
+        instructions.append(Instruction(op, operands, pos))
+    return instructions
+
+
+def jump_targets(instructions: list[Instruction]) -> set[int]:
+    return {i.operands[0] for i in instructions if i.opcode in code.Jumps}
+
+
+def resolve_targets(instructions: list[Instruction], end: int) -> None:
+    """Point jumps at removed instructions to the next surviving one."""
+    positions = [i.position for i in instructions]
+    for i in instructions:
+        if i.opcode in code.Jumps:
+            k = bisect_left(positions, i.operands[0])
+            target = positions[k] if k < len(positions) else end
+            i.operands = [target, *i.operands[1:]]
+
+
+def write_instructions(
+    instructions: list[Instruction], end: int, lines: array | None = None
+) -> bytearray:
+    """Encode instructions, remapping jump targets to their new positions.
+
+    Positions are the byte offsets the instructions were read from, and `end` is
+    the offset one past the original last instruction. Every jump target must
+    be the position of one of the instructions, or `end`. A line table for the
+    original instructions (see code.line_offset) is rewritten in place to match.
+    """
+    moved: dict[int, int] = {}
+    pos = 0
+    for i in instructions:
+        moved[i.position] = pos
+        pos += 1 + sum(code.OpDefs[i.opcode].operand_widths)
+    moved[end] = pos
+    if lines is not None:
+        remap_lines(lines, instructions, moved)
+
+    insts = bytearray()
+    for i in instructions:
+        operands = i.operands
+        if i.opcode in code.Jumps:
+            operands = [moved[operands[0]], *operands[1:]]
+        insts += code.make(i.opcode, *operands)
+    return insts
+
+
+def remap_lines(
+    lines: array, instructions: list[Instruction], moved: dict[int, int]
+) -> None:
+    positions = lines[::2]
+    remapped = array(lines.typecode)
+    for i in instructions:
+        k = bisect_right(positions, i.position)
+        if k == 0:
+            continue
+        offset = lines[2 * k - 1]
+        if not remapped or remapped[-1] != offset:
+            remapped.extend((moved[i.position], offset))
+    lines[:] = remapped
+
+
+def fuse_superinstructions(insts: bytes, lines: array | None = None) -> bytearray:
+    instructions = read_instructions(insts)
+    targets = jump_targets(instructions)
+    fused: list[Instruction] = []
+    i = 0
+    while i < len(instructions):
+        for sequence, superinstruction in SuperInstructions:
+            window = instructions[i : i + len(sequence)]
+            if tuple(w.opcode for w in window) != sequence:
+                continue
+            if any(w.position in targets for w in window[1:]):
+                continue
+            operands = [o for w in window for o in w.operands]
+            fused.append(Instruction(superinstruction, operands, window[0].position))
+            i += len(sequence)
+            break
+        else:
+            fused.append(instructions[i])
+            i += 1
+    return write_instructions(fused, len(insts), lines)
+
+
+def mark_tail_calls(insts: bytes, lines: array | None = None) -> bytearray:
+    """Turn each Call whose result is returned straight away into a TailCall.
+
+    A call is in tail position if the next instruction, after following any
+    unconditional Jumps, is ReturnValue. The ReturnValue stays in place, since
+    the VM only reuses the frame when the callee is a closure.
+    """
+    instructions = read_instructions(insts)
+    at = {i.position: k for k, i in enumerate(instructions)}
+    for k, i in enumerate(instructions):
+        if i.opcode != code.OpCode.Call:
+            continue
+        nxt = k + 1
+        seen: set[int] = set()
+        while (
+            nxt < len(instructions)
+            and instructions[nxt].opcode == code.OpCode.Jump
+            and nxt not in seen
+        ):
+            seen.add(nxt)
+            nxt = at.get(instructions[nxt].operands[0], len(instructions))
+        if nxt < len(instructions) and instructions[nxt].opcode == (
+            code.OpCode.ReturnValue
+        ):
+            i.opcode = code.OpCode.TailCall
+    return write_instructions(instructions, len(insts), lines)
+
+
+# Instructions after which control never falls through to the next one.
+Terminators = {code.OpCode.Jump, code.OpCode.ReturnValue, code.OpCode.Return}
+
+ConstantConditions = {
+    code.OpCode.PTrue: True,
+    code.OpCode.PFalse: False,
+    code.OpCode.PNull: False,
+}
+
+
+def fold_constant_branches(instructions: list[Instruction]) -> bool:
+    """Replace `PTrue; JumpNT` with nothing and `PFalse; JumpNT t` with `Jump t`."""
+    targets = jump_targets(instructions)
+    changed = False
+    i = 0
+    while i < len(instructions) - 1:
+        cond, jump = instructions[i], instructions[i + 1]
+        if (
+            cond.opcode in ConstantConditions
+            and jump.opcode == code.OpCode.JumpNT
+            and jump.position not in targets
+        ):
+            if ConstantConditions[cond.opcode]:
+                del instructions[i : i + 2]
+            else:
+                instructions[i : i + 2] = [
+                    Instruction(code.OpCode.Jump, jump.operands, cond.position)
+                ]
+            changed = True
+        else:
+            i += 1
+    return changed
+
+
+def thread_jumps(instructions: list[Instruction]) -> bool:
+    """Retarget jumps whose destination is an unconditional Jump."""
+    jumps = {i.position: i for i in instructions if i.opcode == code.OpCode.Jump}
+    changed = False
+    for i in instructions:
+        if i.opcode not in code.Jumps:
+            continue
+        target = i.operands[0]
+        seen = {i.position}
+        while target in jumps and target not in seen:
+            seen.add(target)
+            target = jumps[target].operands[0]
+        if target != i.operands[0]:
+            i.operands = [target, *i.operands[1:]]
+            changed = True
+    return changed
+
+
+def remove_unreachable(instructions: list[Instruction]) -> bool:
+    """Drop instructions after a terminator that no jump can reach."""
+    targets = jump_targets(instructions)
+    kept: list[Instruction] = []
+    reachable = True
+    for i in instructions:
+        if i.position in targets:
+            reachable = True
+        if reachable:
+            kept.append(i)
+        reachable = reachable and i.opcode not in Terminators
+    changed = len(kept) != len(instructions)
+    instructions[:] = kept
+    return changed
+
+
+def remove_jumps_to_next(instructions: list[Instruction], end: int) -> bool:
+    kept: list[Instruction] = []
+    for k, i in enumerate(instructions):
+        following = instructions[k + 1].position if k + 1 < len(instructions) else end
+        if i.opcode != code.OpCode.Jump or i.operands[0] != following:
+            kept.append(i)
+    changed = len(kept) != len(instructions)
+    instructions[:] = kept
+    return changed
+
+
+def optimize_jumps(insts: bytes, lines: array | None = None) -> bytearray:
+    """Remove unreachable code and constant branches, and thread jumps.
+
+    Runs the passes to a fixed point, resolving targets after each one so that
+    jumps always land on a surviving instruction.
+    """
+    instructions = read_instructions(insts)
+    end = len(insts)
+    changed = True
+    while changed:
+        changed = fold_constant_branches(instructions)
+        resolve_targets(instructions, end)
+        changed |= thread_jumps(instructions)
+        changed |= remove_unreachable(instructions)
+        resolve_targets(instructions, end)
+        changed |= remove_jumps_to_next(instructions, end)
+        resolve_targets(instructions, end)
+    return write_instructions(instructions, end, lines)
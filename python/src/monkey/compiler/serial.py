@@ -0,0 +1,195 @@
+import hashlib
+import os
+import struct
+from array import array
+from typing import Final
+
+from ..lexer import lexer
+from ..obj import obj
+from . import compiler
+
+MAGIC: Final[bytes] = b"MKC\x00"
+FORMAT_VERSION: Final[int] = 3
+CACHE_SUFFIX: Final[str] = ".mkc"
+
+HEADER = struct.Struct(">4sHH32s")
+U32 = struct.Struct(">I")
+
+TAG_INTEGER: Final[bytes] = b"I"
+TAG_STRING: Final[bytes] = b"S"
+TAG_FUNCTION: Final[bytes] = b"F"
+
+
+def source_hash(source: str) -> bytes:
+    return hashlib.sha256(source.encode()).digest()
+
+
+def stream_hash(
+    stream: lexer.Stream, chunk_size: int = lexer.DEFAULT_CHUNK_SIZE
+) -> bytes:
+    """source_hash of the rest of stream, read a chunk at a time."""
+    h = hashlib.sha256()
+    while data := stream.read(chunk_size):
+        h.update(data.encode() if isinstance(data, str) else data)
+    return h.digest()
+
+
+def dumps(
+    bytecode: compiler.Bytecode, source: str = "", *, digest: bytes | None = None
+) -> bytes:
+    """Serialize bytecode, stamping it with the hash of the source it came from.
+
+    digest, if given, is that hash already worked out, e.g. by stream_hash.
+    """
+    if digest is None:
+        digest = source_hash(source)
+    out = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, compiler.VERSION, digest))
+    out += U32.pack(bytecode.n_globals)
+    write_bytes(out, bytecode.instructions)
+    write_lines(out, bytecode.lines)
+    out += U32.pack(len(bytecode.constants))
+    for c in bytecode.constants:
+        write_constant(out, c)
+    return bytes(out)
+
+
+def loads(
+    data: bytes, source: str | None = None, *, digest: bytes | None = None
+) -> compiler.Bytecode:
+    """Deserialize bytecode written by dumps.
+
+    Raises ValueError if the data is not a compatible .mkc image, or if source,
+    or the digest of one, is given and does not match the hash it was compiled
+    from.
+    """
+    if len(data) < HEADER.size:
+        raise ValueError("truncated bytecode header")
+    if digest is None and source is not None:
+        digest = source_hash(source)
+    magic, fmt, version, stamp = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("not a monkey bytecode file")
+    if fmt != FORMAT_VERSION or version != compiler.VERSION:
+        raise ValueError(f"incompatible bytecode version: {fmt}.{version}")
+    if digest is not None and stamp != digest:
+        raise ValueError("bytecode is stale for this source")
+    try:
+        (n_globals,) = U32.unpack_from(data, HEADER.size)
+        instructions, pos = read_bytes(data, HEADER.size + U32.size)
+        lines, pos = read_lines(data, pos)
+        (n_constants,) = U32.unpack_from(data, pos)
+        pos += U32.size
+        constants: list[obj.Object] = []
+        for _ in range(n_constants):
+            c, pos = read_constant(data, pos)
+            constants.append(c)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"corrupt bytecode: {e}") from e
+    return compiler.Bytecode(bytearray(instructions), constants, n_globals, lines)
+
+
+def write_bytes(out: bytearray, b: bytes) -> None:
+    out += U32.pack(len(b))
+    out += b
+
+
+def read_bytes(data: bytes, pos: int) -> tuple[bytes, int]:
+    (n,) = U32.unpack_from(data, pos)
+    pos += U32.size
+    if pos + n > len(data):
+        raise IndexError("length past end of data")
+    return data[pos : pos + n], pos + n
+
+
+def write_lines(out: bytearray, lines: array) -> None:
+    # Written as U32s rather than with tobytes, whose item size varies.
+    out += U32.pack(len(lines))
+    out += struct.pack(f">{len(lines)}I", *lines)
+
+
+def read_lines(data: bytes, pos: int) -> tuple[array, int]:
+    (n,) = U32.unpack_from(data, pos)
+    pos += U32.size
+    lines = array("L", struct.unpack_from(f">{n}I", data, pos))
+    return lines, pos + n * U32.size
+
+
+def write_constant(out: bytearray, c: obj.Object) -> None:
+    match c:
+        case obj.Integer():
+            n_bytes = c.value.bit_length() // 8 + 1
+            out += TAG_INTEGER
+            write_bytes(out, c.value.to_bytes(n_bytes, "big", signed=True))
+        case obj.String():
+            out += TAG_STRING
+            write_bytes(out, c.value.encode())
+        case obj.CompiledFunction():
+            out += TAG_FUNCTION
+            out += U32.pack(c.n_locals)
+            out += U32.pack(c.n_params)
+            write_bytes(out, c.instructions)
+            write_lines(out, c.lines)
+        case _:
+            raise ValueError(f"cannot serialize constant: {c.otype}")
+
+
+def read_constant(data: bytes, pos: int) -> tuple[obj.Object, int]:
+    tag = data[pos : pos + 1]
+    pos += 1
+    match tag:
+        case b"I":
+            raw, pos = read_bytes(data, pos)
+            return obj.new_integer(int.from_bytes(raw, "big", signed=True)), pos
+        case b"S":
+            raw, pos = read_bytes(data, pos)
+            return obj.String(raw.decode()), pos
+        case b"F":
+            (n_locals,) = U32.unpack_from(data, pos)
+            (n_params,) = U32.unpack_from(data, pos + U32.size)
+            raw, pos = read_bytes(data, pos + 2 * U32.size)
+            lines, pos = read_lines(data, pos)
+            fn = obj.CompiledFunction(bytearray(raw), n_locals, n_params, lines)
+            return fn, pos
+        case _:
+            raise IndexError(f"unknown constant tag {tag!r}")
+
+
+def cache_path(path: str) -> str:
+    return os.path.splitext(path)[0] + CACHE_SUFFIX
+
+
+def read_cache(
+    path: str, source: str = "", *, digest: bytes | None = None
+) -> compiler.Bytecode | None:
+    """Return the cached bytecode for the script at path, if it is still valid.
+
+    As for loads, digest can stand in for the source.
+    """
+    if digest is None:
+        digest = source_hash(source)
+    try:
+        with open(cache_path(path), "rb") as f:
+            return loads(f.read(), digest=digest)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(
+    path: str,
+    source: str,
+    bytecode: compiler.Bytecode,
+    *,
+    digest: bytes | None = None,
+) -> bool:
+    """Write bytecode next to the script at path. Returns False if not writable."""
+    target = cache_path(path)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(dumps(bytecode, source, digest=digest))
+        os.replace(tmp, target)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return False
+    return True
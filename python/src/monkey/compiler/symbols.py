@@ -6,6 +6,7 @@ GLOBAL_SCOPE = Scope("GLOBAL")
 LOCAL_SCOPE = Scope("LOCAL")
 BUILTIN_SCOPE = Scope("BUILTIN")
 FREE_SCOPE = Scope("FREE")
+FUNCTION_SCOPE = Scope("FUNCTION")
 
 
 @dataclass(eq=True, frozen=True)
@@ -28,8 +29,15 @@ class Table:
             store = store
         self.outer: Table | None = outer
         self.free_sym: list[Symbol] = list()
+        # When set, collects every name looked up in this table.
+        self.resolved: set[str] | None = None
+        # When set, records the symbol each name had (None if it had none)
+        # before it was first rebound in this table.
+        self.changed: dict[str, Symbol | None] | None = None
 
     def resolve(self, name: str) -> Symbol | None:
+        if self.resolved is not None:
+            self.resolved.add(name)
         if name not in self.store.keys():
             if self.outer:
                 sym = self.outer.resolve(name)
@@ -41,22 +49,27 @@ class Table:
             return None
         return self.store[name]
 
+    def bind(self, name: str, sym: Symbol) -> Symbol:
+        if self.changed is not None and name not in self.changed:
+            self.changed[name] = self.store.get(name)
+        self.store[name] = sym
+        return sym
+
     def define(self, name: str) -> Symbol:
         scope = GLOBAL_SCOPE
         if self.outer is not None:
             scope = LOCAL_SCOPE
-        sym = Symbol(name, scope, self.n_def)
-        self.store[name] = sym
+        sym = self.bind(name, Symbol(name, scope, self.n_def))
         self.n_def += 1
         return sym
 
     def define_builtin(self, i: int, name: str) -> Symbol:
-        sym = Symbol(name, BUILTIN_SCOPE, i)
-        self.store[name] = sym
-        return sym
+        return self.bind(name, Symbol(name, BUILTIN_SCOPE, i))
+
+    def define_function_name(self, name: str) -> Symbol:
+        return self.bind(name, Symbol(name, FUNCTION_SCOPE, 0))
 
     def define_free(self, og: Symbol) -> Symbol:
         sym = Symbol(og.name, FREE_SCOPE, len(self.free_sym))
         self.free_sym.append(og)
-        self.store[og.name] = sym
-        return sym
+        return self.bind(og.name, sym)
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from typing import List
 
 from ..ast import ast
@@ -6,6 +7,18 @@ from ..obj import env
 from .builtin import BuiltIn
 
 
+@dataclass(slots=True)
+class TailCall:
+    """A call in tail position, left for apply_function's loop to make.
+
+    Like obj.ReturnValue it stops the enclosing blocks, but it never escapes
+    apply_function.
+    """
+
+    fn: obj.Object
+    args: List[obj.Object]
+
+
 def eval(node: ast.Node | None, e: env.Environment) -> obj.Object | None:
     match node:
         case ast.Program():
@@ -39,22 +52,11 @@ def eval(node: ast.Node | None, e: env.Environment) -> obj.Object | None:
                 return obj.ReturnValue(val)
             return None
         case ast.FunctionLiteral():
-            if node.parameters and node.body:
+            if node.parameters is not None and node.body is not None:
                 return obj.Function(node.parameters, node.body, e)
             return None
         case ast.CallExpression():
-            function = eval(node.function, e)
-            if is_error(function):
-                return function
-            if node.arguements is None:
-                args = eval_expressions([], e)
-            else:
-                args = eval_expressions(node.arguements, e)
-            if len(args) == 1 and is_error(args[0]):
-                return args[0]
-            if function and args:
-                return apply_function(function, args)
-            return None
+            return eval_call(node, e, False)
         case ast.ArrayLiteral():
             if node.elements is None:
                 elements = eval_expressions([], e)
@@ -95,7 +97,7 @@ def eval(node: ast.Node | None, e: env.Environment) -> obj.Object | None:
                 return eval_infix_expression(node.operator, left, right, e)
             return None
         case ast.IntegerLiteral():
-            return obj.Integer(node.value)
+            return obj.new_integer(node.value)
         case ast.StringLiteral():
             return obj.String(node.value)
         case ast.Boolean():
@@ -135,17 +137,84 @@ def eval_expressions(
     return result
 
 
+def eval_call(
+    node: ast.CallExpression, e: env.Environment, tail: bool
+) -> obj.Object | TailCall | None:
+    function = eval(node.function, e)
+    if is_error(function):
+        return function
+    if node.arguements is None:
+        args = eval_expressions([], e)
+    else:
+        args = eval_expressions(node.arguements, e)
+    if len(args) == 1 and is_error(args[0]):
+        return args[0]
+    if function is None:
+        return None
+    if tail:
+        return TailCall(function, args)
+    return apply_function(function, args)
+
+
+def eval_tail(
+    node: ast.Node | None, e: env.Environment, tail: bool
+) -> obj.Object | TailCall | None:
+    """Evaluate part of a function body, deferring calls in tail position.
+
+    A call is in tail position if its value is returned from the function: it
+    is the operand of a return, or the last expression on a path through the
+    body (tail is True).
+    """
+    match node:
+        case ast.BlockStatement():
+            result = None
+            for i, stmt in enumerate(node.statements):
+                last = i == len(node.statements) - 1
+                result = eval_tail(stmt, e, tail and last)
+                if type(result) in (obj.ReturnValue, obj.Error, TailCall):
+                    return result
+            return result
+        case ast.ExpressionStatement():
+            return eval_tail(node.expression, e, tail)
+        case ast.ReturnStatement():
+            val = eval_tail(node.value, e, True)
+            if type(val) == TailCall or is_error(val):
+                return val
+            if val:
+                return obj.ReturnValue(val)
+            return None
+        case ast.IfExpression():
+            condition = eval(node.condition, e)
+            if is_error(condition):
+                return condition
+            if is_truthy(condition):
+                return eval_tail(node.consequence, e, tail)
+            elif node.alternative is not None:
+                return eval_tail(node.alternative, e, tail)
+            else:
+                return obj.NULL
+        case ast.CallExpression():
+            return eval_call(node, e, tail)
+        case _:
+            return eval(node, e)
+
+
 def apply_function(
     fn: obj.Object,
     args: List[obj.Object],
 ):
-    if type(fn) == obj.Function:
+    # Tail calls are made by looping here rather than recursing, so deep tail
+    # recursion runs in constant Python stack.
+    while type(fn) == obj.Function:
         extended_e = extend_function_environment(fn, args)
-        evaluated = eval(fn.body, extended_e)
+        evaluated = eval_tail(fn.body, extended_e, True)
+        if type(evaluated) == TailCall:
+            fn, args = evaluated.fn, evaluated.args
+            continue
         if evaluated:
             return unwrap_return_value(evaluated)
         return None
-    elif type(fn) == obj.BuiltIn:
+    if type(fn) == obj.BuiltIn:
         return fn.fn(*args)
     return new_error(f"not a function: {fn.otype}")
 
@@ -223,14 +292,14 @@ def eval_integer_infix_expression(
 ) -> obj.Object:
     match op:
         case "+":
-            return obj.Integer(left.value + right.value)
+            return obj.new_integer(left.value + right.value)
         case "-":
-            return obj.Integer(left.value - right.value)
+            return obj.new_integer(left.value - right.value)
         case "*":
-            return obj.Integer(left.value * right.value)
+            return obj.new_integer(left.value * right.value)
         case "/":
             if right.value != 0:
-                return obj.Integer(left.value // right.value)
+                return obj.new_integer(left.value // right.value)
             else:
                 return obj.NULL
         case "<":
@@ -286,9 +355,7 @@ def eval_array_integer_index_expression(left: obj.Array, index: obj.Integer):
 
 
 def eval_hash_index_expression(left: obj.Hash, key: obj.Object):
-    if key not in left.pairs.keys():
-        return obj.NULL
-    return left.pairs[key]
+    return left.pairs.get(key, obj.NULL)
 
 
 def eval_bang_operator(right: obj.Object, e: env.Environment) -> obj.Object:
@@ -313,11 +380,11 @@ def native_bool_to_obj_bool(native: bool):
 def eval_minus_operator(right: obj.Object, e: env.Environment) -> obj.Object:
     if type(right) != obj.Integer:
         return new_error(f"unknown operator: -{right.otype}")
-    return obj.Integer(-right.value)
+    return obj.new_integer(-right.value)
 
 
 def eval_hash_literal(node: ast.HashLiteral, e: env.Environment) -> obj.Object:
-    pairs = {}
+    pairs = obj.PMap()
     for key_node, val_node in node.pairs.items():
         key = eval(key_node, e)
         if key is None:
@@ -331,7 +398,7 @@ def eval_hash_literal(node: ast.HashLiteral, e: env.Environment) -> obj.Object:
             return new_error(f"missing hash value.")
         if is_error(value):
             return value
-        pairs[key] = value
+        pairs = pairs.assoc(key, value)
     return obj.Hash(pairs)
 
 
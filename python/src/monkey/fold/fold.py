@@ -0,0 +1,143 @@
+from dataclasses import replace
+
+from ..ast import ast
+from ..token import token
+
+# Operators whose result is always an integer (or an error/null) in both engines.
+INTEGER_OPERATORS = {"-", "*", "/"}
+
+
+def fold(node: ast.Node | None) -> ast.Node | None:
+    """Return node with constant subexpressions folded into literals.
+
+    Only folds where the VM and eval agree on the result, so either engine can
+    run the folded tree. Division by zero and mixed-type operands are left alone
+    for the engines to report.
+    """
+    match node:
+        case ast.Program():
+            return ast.Program([fold(s) for s in node.statements])
+        case ast.BlockStatement():
+            return replace(node, statements=[fold(s) for s in node.statements])
+        case ast.LetStatement():
+            return replace(node, value=fold(node.value))
+        case ast.ReturnStatement():
+            return replace(node, value=fold(node.value))
+        case ast.ExpressionStatement():
+            return replace(node, expression=fold(node.expression))
+        case ast.PrefixExpression():
+            return fold_prefix(replace(node, right=fold(node.right)))
+        case ast.InfixExpression():
+            return fold_infix(
+                replace(node, left=fold(node.left), right=fold(node.right))
+            )
+        case ast.IfExpression():
+            return replace(
+                node,
+                condition=fold(node.condition),
+                consequence=fold(node.consequence),
+                alternative=fold(node.alternative),
+            )
+        case ast.FunctionLiteral():
+            return replace(node, body=fold(node.body))
+        case ast.CallExpression():
+            args = node.arguements
+            return replace(
+                node,
+                function=fold(node.function),
+                arguements=[fold(a) for a in args] if args is not None else None,
+            )
+        case ast.ArrayLiteral():
+            elems = node.elements
+            return replace(
+                node, elements=[fold(e) for e in elems] if elems is not None else None
+            )
+        case ast.HashLiteral():
+            return replace(
+                node, pairs={fold(k): fold(v) for k, v in node.pairs.items()}
+            )
+        case ast.IndexExpression():
+            return replace(node, left=fold(node.left), index=fold(node.index))
+        case _:
+            return node
+
+
+def integer(value: int, offset: int = -1) -> ast.IntegerLiteral:
+    return ast.IntegerLiteral(token.Token(token.INT, str(value)), value, offset)
+
+
+def boolean(value: bool, offset: int = -1) -> ast.Boolean:
+    if value:
+        return ast.Boolean(token.Token(token.TRUE, "true"), True, offset)
+    return ast.Boolean(token.Token(token.FALSE, "false"), False, offset)
+
+
+def is_integer_expression(node: ast.Node | None) -> bool:
+    match node:
+        case ast.IntegerLiteral():
+            return True
+        case ast.PrefixExpression(operator="-"):
+            return True
+        case ast.InfixExpression(operator=op):
+            return op in INTEGER_OPERATORS
+        case _:
+            return False
+
+
+def fold_prefix(node: ast.PrefixExpression) -> ast.Expression:
+    match node.operator, node.right:
+        case "-", ast.IntegerLiteral(value=v):
+            return integer(-v, node.offset)
+        case "!", ast.Boolean(value=v):
+            return boolean(not v, node.offset)
+        case _:
+            return node
+
+
+def fold_infix(node: ast.InfixExpression) -> ast.Expression:
+    op, left, right = node.operator, node.left, node.right
+    match left, right:
+        case ast.IntegerLiteral(value=lv), ast.IntegerLiteral(value=rv):
+            match op:
+                case "+":
+                    return integer(lv + rv, node.offset)
+                case "-":
+                    return integer(lv - rv, node.offset)
+                case "*":
+                    return integer(lv * rv, node.offset)
+                case "/" if rv != 0:
+                    return integer(lv // rv, node.offset)
+                case "<":
+                    return boolean(lv < rv, node.offset)
+                case ">":
+                    return boolean(lv > rv, node.offset)
+                case "==":
+                    return boolean(lv == rv, node.offset)
+                case "!=":
+                    return boolean(lv != rv, node.offset)
+        case ast.StringLiteral(value=lv), ast.StringLiteral(value=rv) if op == "+":
+            tok = token.Token(token.STRING, lv + rv)
+            return ast.StringLiteral(tok, lv + rv, node.offset)
+        case ast.Boolean(value=lv), ast.Boolean(value=rv) if op in ("==", "!="):
+            return boolean((lv == rv) == (op == "=="), node.offset)
+    return simplify(node)
+
+
+def simplify(node: ast.InfixExpression) -> ast.Expression:
+    """Drop identity operands, e.g. x * 1, for operands known to be integers."""
+    op, left, right = node.operator, node.left, node.right
+    match right:
+        case ast.IntegerLiteral(value=0) if op in ("+", "-"):
+            if is_integer_expression(left):
+                return left
+        case ast.IntegerLiteral(value=1) if op in ("*", "/"):
+            if is_integer_expression(left):
+                return left
+    match left:
+        case ast.IntegerLiteral(value=0) if op == "+":
+            if is_integer_expression(right):
+                return right
+        case ast.IntegerLiteral(value=1) if op == "*":
+            if is_integer_expression(right):
+                return right
+    return node
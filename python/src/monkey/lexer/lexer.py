@@ -1,7 +1,152 @@
+import codecs
+import re
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
+from typing import Final, Protocol
 
 from ..token import token
 
+ENGINES: Final[tuple[str, ...]] = ("char", "regex", "arrays")
+
+
+SIMPLE_ESCAPES: Final[dict[str, str]] = {
+    "\\": "\\",
+    '"': '"',
+    "'": "'",
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+    # A backslash at the end of a line continues the string on the next.
+    "\n": "",
+}
+# The simple escapes decode_string can leave to str.replace. None of them
+# produce a character that another escape could take as an argument.
+REPLACED_ESCAPES: Final[tuple[tuple[str, str], ...]] = tuple(
+    ("\\" + char, decoded)
+    for char, decoded in SIMPLE_ESCAPES.items()
+    if char not in "\\\n"
+)
+# Escapes followed by exactly this many hex digits naming a code point.
+HEX_ESCAPES: Final[dict[str, int]] = {"x": 2, "u": 4, "U": 8}
+HEX_DIGITS: Final[frozenset[str]] = frozenset("0123456789abcdefABCDEF")
+OCTAL_DIGITS: Final[frozenset[str]] = frozenset("01234567")
+
+
+def decode_string(raw: str) -> str:
+    """Process the escapes in the body of a string literal.
+
+    The escapes are Python's. One that is unknown or malformed is kept as it is,
+    backslash and all.
+    """
+    if "\\" not in raw:
+        return raw
+    # After splitting off escaped backslashes, each backslash left in a piece
+    # starts an escape.
+    return "\\".join(
+        decode_escapes(piece) if "\\" in piece else piece for piece in raw.split("\\\\")
+    )
+
+
+def decode_escapes(raw: str) -> str:
+    for escape, decoded in REPLACED_ESCAPES:
+        if escape in raw:
+            raw = raw.replace(escape, decoded)
+    if "\\" not in raw:
+        return raw
+    out = []
+    pos = 0
+    while (i := raw.find("\\", pos)) >= 0:
+        out.append(raw[pos:i])
+        char = raw[i + 1 : i + 2]
+        pos = i + 2
+        decoded = SIMPLE_ESCAPES.get(char)
+        if decoded is None:
+            decoded, pos = decode_code_point(raw, char, pos)
+        out.append(decoded)
+    out.append(raw[pos:])
+    return "".join(out)
+
+
+def decode_code_point(raw: str, char: str, pos: int) -> tuple[str, int]:
+    """Decode the escape \\char whose argument, if any, starts at pos.
+
+    Returns the decoded text and where the escape ends.
+    """
+    n = HEX_ESCAPES.get(char)
+    if n is not None:
+        digits = raw[pos : pos + n]
+        if len(digits) == n and HEX_DIGITS.issuperset(digits):
+            code = int(digits, 16)
+            if code <= sys.maxunicode:
+                return chr(code), pos + n
+    elif "0" <= char <= "7":
+        end = pos
+        while end < pos + 2 and raw[end : end + 1] in OCTAL_DIGITS:
+            end += 1
+        return chr(int(raw[pos - 1 : end], 8)), end
+    elif char == "N" and raw[pos : pos + 1] == "{":
+        end = raw.find("}", pos)
+        if end > 0:
+            try:
+                return unicodedata.lookup(raw[pos + 1 : end]), end + 1
+            except KeyError:
+                pass
+    return "\\" + char, pos
+
+
+# The body of a string literal, up to its closing quote or a NUL.
+STRING_BODY: Final[str] = r'[^"\\\0]*(?:\\[^\0][^"\\\0]*)*\\?'
+STRING_BODY_RE: Final[re.Pattern] = re.compile(STRING_BODY)
+
+
+def string_end(input: str, start: int) -> int:
+    """Where the string literal whose body begins at start ends.
+
+    That is its closing quote, or the NUL or end of input cutting it short.
+    """
+    end = input.find('"', start)
+    if end < 0:
+        end = len(input)
+    if input.find("\\", start, end) >= 0:
+        # Escapes can hide quotes and NULs; the regex pairs them up.
+        m = STRING_BODY_RE.match(input, start)
+        assert m is not None  # the body may be empty
+        return m.end()
+    nul = input.find("\0", start, end)
+    return end if nul < 0 else nul
+
+
+class LineIndex:
+    """Converts offsets into a source to line and column numbers.
+
+    Lexers only record where each token starts; line and column are worked out
+    here, when something needs to be reported.
+    """
+
+    def __init__(self, source: str = "") -> None:
+        self.line_starts: array = array("L", [0])
+        self.extend(source, 0)
+
+    def extend(self, text: str, start: int) -> None:
+        """Add the lines of text, which continues the source at offset start."""
+        self.line_starts.extend(start + m.end() for m in re.finditer("\n", text))
+
+    def location(self, offset: int) -> tuple[int, int]:
+        """Return the 1-based (line, column) of offset."""
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def describe(self, offset: int) -> str:
+        line, column = self.location(offset)
+        return f"line {line}, column {column}"
+
 
 @dataclass
 class Lexer:
@@ -9,6 +154,8 @@ class Lexer:
     position: int = 0
     read_position: int = 0
     ch: int = 0
+    # Where the last token returned by next_token starts.
+    offset: int = 0
 
     def __post_init__(self) -> None:
         self.read_char()
@@ -52,27 +199,14 @@ class Lexer:
 
     def read_string(self) -> str:
         start = self.position + 1
-        esc = False
-        esc_idx = []
-        while True:
-            self.read_char()
-            if self.ch == 0:
-                break
-            if not esc:
-                if self.ch == ord('"'):
-                    break
-                if self.ch == ord("\\"):
-                    esc = True
-                    esc_idx.append(self.position)
-            else:
-                esc = False
-        # process escape chars using python decode
-        bytestring = self.input[start : self.position].encode()
-        return bytestring.decode("unicode_escape")
+        self.read_position = string_end(self.input, start)
+        self.read_char()
+        return decode_string(self.input[start : self.position])
 
     def next_token(self) -> token.Token:
         tok = None
         self.skip_whitespace()
+        self.offset = min(self.position, len(self.input))
         match chr(self.ch):
             case "=":
                 if chr(self.peak_char()) == "=":
@@ -135,3 +269,340 @@ class Lexer:
                     tok = token.Token(token.ILLEGAL, chr(self.ch))
         self.read_char()
         return tok
+
+
+OPERATORS: Final[dict[str, token.TokenType]] = {
+    "==": token.EQ,
+    "!=": token.NOT_EQ,
+    "=": token.ASSIGN,
+    ";": token.SEMICOLON,
+    ":": token.COLON,
+    "(": token.LPAREN,
+    ")": token.RPAREN,
+    ",": token.COMMA,
+    "+": token.PLUS,
+    "-": token.MINUS,
+    "!": token.BANG,
+    "*": token.ASTERISK,
+    "/": token.SLASH,
+    "<": token.LT,
+    ">": token.GT,
+    "{": token.LBRACE,
+    "}": token.RBRACE,
+    "[": token.LBRACKET,
+    "]": token.RBRACKET,
+}
+
+# One match per token. \s is exactly str.isspace, and [^\W\d] is every
+# character str.isalpha accepts plus "_" and a few numeric symbols like "²",
+# which RegexLexer trims back off.
+TOKEN_RE: Final[re.Pattern] = re.compile(
+    r"""\s*(?:
+    (?P<word>[^\W\d]+|[0-9]+|==|!=|[=;:(),+\-!*/<>{}\[\]])
+    |(?P<string>"%s)
+    |(?P<eof>\0|\Z)
+    |(?P<illegal>.)
+    )"""
+    % STRING_BODY,
+    re.VERBOSE | re.DOTALL,
+)
+WORD_GROUP, STRING_GROUP, EOF_GROUP = 1, 2, 3
+
+EOF_TOKEN: Final[token.Token] = token.Token(token.EOF, "")
+
+
+@dataclass
+class RegexLexer:
+    """Lexer producing the same tokens as Lexer by matching TOKEN_RE.
+
+    Tokens are immutable, so identifiers, integers and operators that repeat
+    share one Token per literal.
+    """
+
+    input: str = ""
+    position: int = 0
+    offset: int = 0
+
+    def __post_init__(self) -> None:
+        self.reset_tokens()
+
+    def reset_tokens(self) -> None:
+        self.tokens: dict[str, token.Token] = {
+            op: token.Token(token_type, op) for op, token_type in OPERATORS.items()
+        }
+
+    def match(self) -> re.Match:
+        m = TOKEN_RE.match(self.input, self.position)
+        assert m is not None  # illegal matches any character, eof the end
+        return m
+
+    def next_token(self) -> token.Token:
+        m = self.match()
+        self.position = m.end()
+        word = m[WORD_GROUP]
+        if word is not None:
+            self.offset = self.position - len(word)
+            tok = self.tokens.get(word)
+            if tok is None:
+                tok = self.new_word_token(word, self.offset)
+            return tok
+        group = m.lastindex
+        self.offset = m.start(group)
+        if group == STRING_GROUP:
+            # Skip the closing quote, or the NUL that cut the literal short.
+            self.position += 1
+            return token.Token(token.STRING, decode_string(m[STRING_GROUP][1:]))
+        if group == EOF_GROUP:
+            return EOF_TOKEN
+        return token.Token(token.ILLEGAL, m["illegal"])
+
+    def new_word_token(self, word: str, start: int) -> token.Token:
+        if word[0] in "0123456789":
+            tok = token.Token(token.INT, word)
+        elif word.isascii():
+            tok = token.Token(token.lookup_ident(word), word)
+        else:
+            return self.read_unicode_identifier(word, start)
+        self.tokens[word] = tok
+        return tok
+
+    def read_unicode_identifier(self, word: str, start: int) -> token.Token:
+        n = identifier_length(word)
+        if n == 0:
+            # A character identifiers can't hold is an ILLEGAL token of its own.
+            self.position = start + 1
+            return token.Token(token.ILLEGAL, self.input[start])
+        self.position = start + n
+        return token.Token(token.lookup_ident(word[:n]), word[:n])
+
+
+class Stream(Protocol):
+    # A text file, or a binary file or mmap holding UTF-8.
+    def read(self, size: int, /) -> str | bytes:
+        ...
+
+
+class SeekableStream(Stream, Protocol):
+    def tell(self) -> int:
+        ...
+
+    def seek(self, pos: int, /) -> object:
+        ...
+
+
+DEFAULT_CHUNK_SIZE: Final[int] = 1 << 16
+MAX_CACHED_TOKENS: Final[int] = 4096
+
+
+class StreamLexer(RegexLexer):
+    """RegexLexer reading its input from a stream, chunk_size at a time.
+
+    Text before the token being matched is dropped as the buffer is refilled,
+    so memory stays around chunk_size however long the stream is; only a single
+    token longer than that, like a huge string literal, grows the buffer. The
+    token cache is bounded too. Offsets count characters from the start of the
+    stream, and lines records where each line starts for reporting them.
+    """
+
+    def __init__(self, stream: Stream, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        super().__init__()
+        self.stream: Stream = stream
+        self.chunk_size: int = chunk_size
+        # Where input[0] is in the stream.
+        self.base: int = 0
+        self.exhausted: bool = False
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.lines: LineIndex = LineIndex()
+
+    def match(self) -> re.Match:
+        while True:
+            m = TOKEN_RE.match(self.input, self.position)
+            assert m is not None  # illegal matches any character, eof the end
+            # A match that runs into the end of the buffer might carry on in the
+            # next chunk, like "=" before "=" or a string without its quote.
+            if m.end() < len(self.input) or self.exhausted:
+                return m
+            self.refill()
+
+    def next_token(self) -> token.Token:
+        tok = super().next_token()
+        self.offset += self.base
+        return tok
+
+    def refill(self) -> None:
+        data = self.stream.read(self.chunk_size)
+        if isinstance(data, str):
+            chunk = data
+        else:
+            # A character split between chunks is held back by the decoder.
+            chunk = self.decoder.decode(data, final=not data)
+        if not data:
+            self.exhausted = True
+        self.lines.extend(chunk, self.base + len(self.input))
+        self.input = self.input[self.position :] + chunk
+        self.base += self.position
+        self.position = 0
+        if len(self.tokens) > MAX_CACHED_TOKENS:
+            self.reset_tokens()
+
+
+def index_lines(stream: Stream, chunk_size: int = DEFAULT_CHUNK_SIZE) -> LineIndex:
+    """LineIndex of the rest of stream, read a chunk at a time."""
+    index = LineIndex()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    offset = 0
+    while data := stream.read(chunk_size):
+        chunk = data if isinstance(data, str) else decoder.decode(data)
+        index.extend(chunk, offset)
+        offset += len(chunk)
+    return index
+
+
+def identifier_length(word: str) -> int:
+    """Length of the identifier at the start of a non-ASCII word match."""
+    for i, char in enumerate(word):
+        if not (char.isalpha() or char == "_"):
+            return i
+    return len(word)
+
+
+STRING_CODE: Final[int] = token.TYPE_CODES[token.STRING]
+EOF_CODE: Final[int] = token.TYPE_CODES[token.EOF]
+ILLEGAL_CODE: Final[int] = token.TYPE_CODES[token.ILLEGAL]
+IDENT_CODE: Final[int] = token.TYPE_CODES[token.IDENT]
+INT_CODE: Final[int] = token.TYPE_CODES[token.INT]
+WORD_CODES: Final[dict[str, int]] = {
+    op: token.TYPE_CODES[token_type] for op, token_type in OPERATORS.items()
+} | {word: token.TYPE_CODES[token_type] for word, token_type in token.KEYWORDS.items()}
+
+
+@dataclass
+class TokenArrays:
+    """A token stream stored as parallel arrays rather than Token objects.
+
+    Token i has type token.TOKEN_TYPES[types[i]] and its literal is the source
+    text at starts[i] of length lengths[i], with escapes decoded for strings.
+    Literals are only sliced out when asked for. A string's literal starts after
+    its opening quote.
+    """
+
+    source: str
+    types: array
+    starts: array
+    lengths: array
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def token_type(self, i: int) -> token.TokenType:
+        return token.TOKEN_TYPES[self.types[i]]
+
+    def literal(self, i: int) -> str:
+        start = self.starts[i]
+        raw = self.source[start : start + self.lengths[i]]
+        if self.types[i] == STRING_CODE:
+            return decode_string(raw)
+        return raw
+
+    def token(self, i: int) -> token.Token:
+        return token.Token(self.token_type(i), self.literal(i))
+
+    def offset(self, i: int) -> int:
+        """Where token i starts in the source, including a string's quote."""
+        if self.types[i] == STRING_CODE:
+            return self.starts[i] - 1
+        return self.starts[i]
+
+
+def tokenize_all(source: str) -> TokenArrays:
+    """Lex all of source at once, ending with a single EOF token."""
+    types = array("B")
+    starts = array("L")
+    lengths = array("L")
+    codes = WORD_CODES
+    match = TOKEN_RE.match
+    add_type, add_start, add_length = types.append, starts.append, lengths.append
+    pos = 0
+    while True:
+        m = match(source, pos)
+        assert m is not None  # illegal matches any character, eof the end
+        pos = m.end()
+        group = m.lastindex
+        start = m.start(group)
+        if group == WORD_GROUP:
+            word = m[WORD_GROUP]
+            code = codes.get(word)
+            if code is None:
+                if word[0] in "0123456789":
+                    code = INT_CODE
+                elif word.isascii():
+                    code = IDENT_CODE
+                else:
+                    n = identifier_length(word)
+                    if n == 0:
+                        code = ILLEGAL_CODE
+                        n = 1
+                    else:
+                        code = token.TYPE_CODES[token.lookup_ident(word[:n])]
+                    pos = start + n
+            length = pos - start
+        elif group == STRING_GROUP:
+            code = STRING_CODE
+            start += 1
+            length = pos - start
+            pos += 1
+        elif group == EOF_GROUP:
+            code = EOF_CODE
+            length = 0
+        else:
+            code = ILLEGAL_CODE
+            length = 1
+        add_type(code)
+        add_start(start)
+        add_length(length)
+        if group == EOF_GROUP and not m[EOF_GROUP]:
+            return TokenArrays(source, types, starts, lengths)
+
+
+class TokenSource(Protocol):
+    # Where the last token returned by next_token starts in the source.
+    offset: int
+
+    def next_token(self) -> token.Token:
+        ...
+
+
+class ArrayLexer:
+    """Feeds TokenArrays to the parser through the usual next_token()."""
+
+    def __init__(self, tokens: TokenArrays) -> None:
+        self.tokens: TokenArrays = tokens
+        self.index: int = 0
+        self.offset: int = 0
+        self.cache: dict[tuple[int, str], token.Token] = {}
+
+    def next_token(self) -> token.Token:
+        i = self.index
+        self.offset = self.tokens.offset(i)
+        if i < len(self.tokens) - 1:
+            self.index += 1
+        code = self.tokens.types[i]
+        literal = self.tokens.literal(i)
+        tok = self.cache.get((code, literal))
+        if tok is None:
+            tok = token.Token(token.TOKEN_TYPES[code], literal)
+            self.cache[(code, literal)] = tok
+        return tok
+
+
+def new_lexer(input: str, engine: str = "regex") -> TokenSource:
+    """Return a lexer for input; all engines produce the same tokens."""
+    match engine:
+        case "char":
+            return Lexer(input)
+        case "regex":
+            return RegexLexer(input)
+        case "arrays":
+            return ArrayLexer(tokenize_all(input))
+        case _:
+            raise ValueError(f"unknown lexer engine: {engine}")
@@ -11,9 +11,9 @@ def _monkey_builtin_len(*args: obj.Object) -> obj.Object:
         return new_error(f"wrong number of arguements. got={len(args)}, want=1")
     match args[0]:
         case obj.String():
-            return obj.Integer(len(args[0].value))
+            return obj.new_integer(len(args[0].value))
         case obj.Array():
-            return obj.Integer(len(args[0].elements))
+            return obj.new_integer(len(args[0].elements))
         case obj.Object():
             return new_error(f"arguement to `len` not supported. got {args[0].otype}")
         case _:
@@ -56,8 +56,7 @@ def _monkey_builtin_rest(*args: obj.Object) -> obj.Object:
     match args[0]:
         case obj.Array():
             if len(args[0].elements) > 0:
-                array = args[0].elements[1:]
-                return obj.Array(array.copy())
+                return obj.Array(args[0].elements.rest())
             else:
                 return obj.NULL
         case obj.Object():
@@ -71,9 +70,7 @@ def _monkey_builtin_push(*args: obj.Object) -> obj.Object:
         return new_error(f"wrong number of arguements. got={len(args)}, want=2")
     match args[0]:
         case obj.Array():
-            array = args[0].elements.copy()
-            array.append(args[1])
-            return obj.Array(array)
+            return obj.Array(args[0].elements.push(args[1]))
         case obj.Object():
             return new_error(f"arguement to `push` not supported. got {args[0].otype}")
         case _:
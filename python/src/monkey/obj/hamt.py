@@ -0,0 +1,184 @@
+from typing import Any, Iterable, Iterator
+
+from .pvector import PVector
+
+BITS = 5
+MASK = (1 << BITS) - 1
+HASH_MASK = (1 << 64) - 1
+
+_MISSING = object()
+
+
+class _Node:
+    """Bitmap-indexed trie node.
+
+    entries holds, in bit order, either (hash, key, value) tuples or child nodes.
+    """
+
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap: int, entries: list) -> None:
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _Collision:
+    """Keys whose full hashes are equal."""
+
+    __slots__ = ("hash", "pairs")
+
+    def __init__(self, h: int, pairs: list[tuple[Any, Any]]) -> None:
+        self.hash = h
+        self.pairs = pairs
+
+
+def _hash(key: Any) -> int:
+    return hash(key) & HASH_MASK
+
+
+def _assoc(node: Any, shift: int, h: int, key: Any, value: Any) -> tuple[Any, bool]:
+    """Return (new node, whether key was added) with key set to value."""
+    if isinstance(node, _Collision):
+        if node.hash != h:
+            wrapper = _Node(1 << ((node.hash >> shift) & MASK), [node])
+            return _assoc(wrapper, shift, h, key, value)
+        for i, (k, _) in enumerate(node.pairs):
+            if k == key:
+                pairs = node.pairs.copy()
+                pairs[i] = (key, value)
+                return _Collision(h, pairs), False
+        return _Collision(h, node.pairs + [(key, value)]), True
+
+    bit = 1 << ((h >> shift) & MASK)
+    idx = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries.copy()
+    if not node.bitmap & bit:
+        entries.insert(idx, (h, key, value))
+        return _Node(node.bitmap | bit, entries), True
+
+    entry = entries[idx]
+    if type(entry) is not tuple:
+        entries[idx], added = _assoc(entry, shift + BITS, h, key, value)
+        return _Node(node.bitmap, entries), added
+    if entry[0] == h and (entry[1] is key or entry[1] == key):
+        entries[idx] = (h, key, value)
+        return _Node(node.bitmap, entries), False
+    if entry[0] == h:
+        entries[idx] = _Collision(h, [(entry[1], entry[2]), (key, value)])
+    else:
+        child = _Node(1 << ((entry[0] >> (shift + BITS)) & MASK), [entry])
+        entries[idx], _ = _assoc(child, shift + BITS, h, key, value)
+    return _Node(node.bitmap, entries), True
+
+
+def _assoc_in_place(
+    node: Any, shift: int, h: int, key: Any, value: Any
+) -> tuple[Any, bool]:
+    """Like _assoc, but mutates node. Only for nodes no other map can see."""
+    if isinstance(node, _Collision):
+        return _assoc(node, shift, h, key, value)
+
+    bit = 1 << ((h >> shift) & MASK)
+    idx = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries
+    if not node.bitmap & bit:
+        entries.insert(idx, (h, key, value))
+        node.bitmap |= bit
+        return node, True
+
+    entry = entries[idx]
+    if type(entry) is not tuple:
+        entries[idx], added = _assoc_in_place(entry, shift + BITS, h, key, value)
+        return node, added
+    if entry[0] == h and (entry[1] is key or entry[1] == key):
+        entries[idx] = (h, key, value)
+        return node, False
+    # Splitting an entry into a subtrie is rare; reuse the persistent path.
+    return _assoc(node, shift, h, key, value)
+
+
+class PMap:
+    """Persistent hash map: a hash array mapped trie with structural sharing.
+
+    assoc() returns a new map and leaves the old one untouched. Iteration follows
+    insertion order, which is tracked in a PVector of keys.
+    """
+
+    __slots__ = ("_root", "_order")
+
+    def __init__(self, root: _Node | None = None, order: PVector | None = None):
+        self._root = root if root is not None else _Node(0, [])
+        self._order = order if order is not None else PVector()
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[tuple[Any, Any]]) -> "PMap":
+        # Nodes built here are private until returned, so mutate them in place.
+        root: Any = _Node(0, [])
+        order = []
+        for key, value in pairs:
+            root, added = _assoc_in_place(root, 0, _hash(key), key, value)
+            if added:
+                order.append(key)
+        return cls(root, PVector.from_iterable(order))
+
+    def assoc(self, key: Any, value: Any) -> "PMap":
+        root, added = _assoc(self._root, 0, _hash(key), key, value)
+        order = self._order.push(key) if added else self._order
+        return PMap(root, order)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        h = _hash(key)
+        node: Any = self._root
+        shift = 0
+        while True:
+            if isinstance(node, _Collision):
+                for k, v in node.pairs:
+                    if k == key:
+                        return v
+                return default
+            bit = 1 << ((h >> shift) & MASK)
+            if not node.bitmap & bit:
+                return default
+            entry = node.entries[(node.bitmap & (bit - 1)).bit_count()]
+            if type(entry) is tuple:
+                if entry[0] == h and (entry[1] is key or entry[1] == key):
+                    return entry[2]
+                return default
+            node = entry
+            shift += BITS
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._order)
+
+    def keys(self) -> Iterator[Any]:
+        return iter(self._order)
+
+    def values(self) -> Iterator[Any]:
+        return (self[k] for k in self._order)
+
+    def items(self) -> Iterator[tuple[Any, Any]]:
+        return ((k, self[k]) for k in self._order)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (PMap, dict)):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        return all(other.get(k, _MISSING) == v for k, v in self.items())
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"PMap({dict(self.items())!r})"
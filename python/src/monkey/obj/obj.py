@@ -1,9 +1,12 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from typing import Callable, Dict, Final, List, NewType
+from array import array
+from dataclasses import dataclass, field
+from typing import Callable, Final, List, NewType
 
 from ..ast import ast
 from ..code import code
+from .hamt import PMap
+from .pvector import PVector
 
 ObjectType = NewType("ObjectType", str)
 
@@ -22,7 +25,10 @@ COMPILED_FUNCTION_OBJ: Final[ObjectType] = ObjectType("COMPILED_FUNCTION")
 CLOSURE_OBJ: Final[ObjectType] = ObjectType("CLOSURE")
 
 
-@dataclass(eq=True, frozen=True)
+# Objects are treated as immutable, but are not frozen dataclasses: frozen
+# construction goes through object.__setattr__, which is measurably slower for
+# values the VM allocates on every arithmetic instruction.
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class Object(ABC):
     @property
     @abstractmethod
@@ -35,7 +41,7 @@ class Object(ABC):
         pass
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class Integer(Object):
     value: int
 
@@ -48,7 +54,28 @@ class Integer(Object):
         return str(self.value)
 
 
-@dataclass(eq=True, frozen=True)
+SMALL_INT_LOW: int = -5
+SMALL_INT_HIGH: int = 1024
+SMALL_INTS: list[Integer] = []
+
+
+def set_small_int_range(low: int, high: int) -> None:
+    """Preallocate the shared Integer objects for low..high (inclusive)."""
+    global SMALL_INT_LOW, SMALL_INT_HIGH
+    SMALL_INT_LOW, SMALL_INT_HIGH = low, high
+    SMALL_INTS[:] = [Integer(i) for i in range(low, high + 1)]
+
+
+def new_integer(value: int) -> Integer:
+    if SMALL_INT_LOW <= value <= SMALL_INT_HIGH:
+        return SMALL_INTS[value - SMALL_INT_LOW]
+    return Integer(value)
+
+
+set_small_int_range(SMALL_INT_LOW, SMALL_INT_HIGH)
+
+
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class String(Object):
     value: str
 
@@ -61,7 +88,7 @@ class String(Object):
         return str(self.value)
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class Boolean(Object):
     value: bool
 
@@ -74,7 +101,7 @@ class Boolean(Object):
         return str(self.value).lower()  # True -> true
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class Null(Object):
     @property
     def otype(self) -> ObjectType:
@@ -90,7 +117,7 @@ FALSE: Final[Boolean] = Boolean(False)
 NULL: Final[Null] = Null()
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class ReturnValue(Object):
     value: Object
 
@@ -103,9 +130,13 @@ class ReturnValue(Object):
         return self.value.inspect
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class Error(Object):
     message: str
+    # Where in the source the error happened, or -1 if unknown.
+    offset: int = field(default=-1, compare=False)
+    # The source offset points into, as for CompiledFunction.source.
+    source: object = field(default=None, compare=False)
 
     @property
     def otype(self) -> ObjectType:
@@ -116,7 +147,7 @@ class Error(Object):
         return "ERROR: " + self.message
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class Function(Object):
     from . import env
 
@@ -136,11 +167,39 @@ class Function(Object):
         return string
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class CompiledFunction(Object):
     instructions: bytearray
     n_locals: int
     n_params: int
+    # Maps instructions to source offsets, see code.line_offset.
+    lines: array = field(default_factory=lambda: array("L"), compare=False)
+    # The source lines points into: its text, or the LineIndex of a source
+    # that wasn't kept. None if unknown.
+    source: object = field(default=None, compare=False)
+    _decoded: list[code.DecodedInstruction] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def decoded(self) -> list[code.DecodedInstruction]:
+        if self._decoded is None:
+            self._decoded = code.decode(self.instructions)
+        return self._decoded
+
+    @property
+    def frame_size(self) -> int:
+        """Upper bound on the stack slots a call uses, including locals.
+
+        Jumps only go forward, so each instruction runs at most once per call
+        and leaves at most two values on the stack.
+        """
+        return self.n_locals + 2 * len(self.decoded) + 1
+
+    def offset_at(self, index: int) -> int:
+        """Source offset of the index-th decoded instruction, or -1."""
+        ip = code.instruction_position(self.instructions, index)
+        return code.line_offset(self.lines, ip)
 
     @property
     def otype(self) -> ObjectType:
@@ -154,7 +213,7 @@ class CompiledFunction(Object):
         return f"compiled_function[\n    {str_inst}\n]"
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class Closure(Object):
     fn: CompiledFunction
     free: list[Object]
@@ -174,7 +233,7 @@ class Closure(Object):
         return str_inpsect
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class BuiltIn(Object):
     fn: Callable[..., Object]
 
@@ -187,9 +246,13 @@ class BuiltIn(Object):
         return "builtin function"
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class Array(Object):
-    elements: List[Object]
+    elements: PVector  # lists are converted on construction
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.elements, PVector):
+            self.elements = PVector.from_iterable(self.elements)
 
     @property
     def otype(self) -> ObjectType:
@@ -200,9 +263,13 @@ class Array(Object):
         return "[" + ", ".join([e.inspect for e in self.elements]) + "]"
 
 
-@dataclass(eq=True, frozen=True)
+@dataclass(eq=True, unsafe_hash=True, slots=True)
 class Hash(Object):
-    pairs: Dict[Object, Object]
+    pairs: PMap  # dicts are converted on construction
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.pairs, PMap):
+            self.pairs = PMap.from_pairs(self.pairs.items())
 
     @property
     def otype(self) -> ObjectType:
@@ -0,0 +1,131 @@
+from typing import Any, Iterable, Iterator
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+class PVector:
+    """Persistent vector: a 32-way trie plus a tail buffer.
+
+    Nodes are never mutated once built, so push() and rest() return new vectors
+    that share structure with the old one. rest() is a view that skips the first
+    element, and a view can be pushed onto like any other vector.
+    """
+
+    __slots__ = ("_count", "_shift", "_root", "_tail", "_start")
+
+    def __init__(
+        self,
+        count: int = 0,
+        shift: int = BITS,
+        root: list | None = None,
+        tail: list | None = None,
+        start: int = 0,
+    ) -> None:
+        self._count = count
+        self._shift = shift
+        self._root: list = root if root is not None else []
+        self._tail: list = tail if tail is not None else []
+        self._start = start
+
+    @classmethod
+    def from_iterable(cls, items: Iterable[Any]) -> "PVector":
+        items = list(items)
+        count = len(items)
+        # The tail always holds the last 1..32 elements.
+        tail_off = ((count - 1) >> BITS) << BITS if count else 0
+        nodes: list = [items[i : i + WIDTH] for i in range(0, tail_off, WIDTH)]
+        shift = BITS
+        while len(nodes) > WIDTH:
+            nodes = [nodes[i : i + WIDTH] for i in range(0, len(nodes), WIDTH)]
+            shift += BITS
+        return cls(count, shift, nodes, items[tail_off:])
+
+    def __len__(self) -> int:
+        return self._count - self._start
+
+    def _tail_off(self) -> int:
+        return self._count - len(self._tail)
+
+    def _leaf(self, i: int) -> list:
+        if i >= self._tail_off():
+            return self._tail
+        node = self._root
+        for level in range(self._shift, 0, -BITS):
+            node = node[(i >> level) & MASK]
+        return node
+
+    def __getitem__(self, index: int) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("PVector index out of range")
+        i = index + self._start
+        return self._leaf(i)[i & MASK]
+
+    def __iter__(self) -> Iterator[Any]:
+        i = self._start
+        while i < self._count:
+            leaf = self._leaf(i)
+            yield from leaf[i & MASK :]
+            i = (i | MASK) + 1
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (PVector, list, tuple)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"PVector({list(self)!r})"
+
+    def push(self, item: Any) -> "PVector":
+        if len(self._tail) < WIDTH:
+            return PVector(
+                self._count + 1,
+                self._shift,
+                self._root,
+                self._tail + [item],
+                self._start,
+            )
+        shift = self._shift
+        if (self._count >> BITS) > (1 << shift):
+            root = [self._root, self._new_path(shift, self._tail)]
+            shift += BITS
+        else:
+            root = self._push_tail(shift, self._root, self._tail)
+        return PVector(self._count + 1, shift, root, [item], self._start)
+
+    def rest(self) -> "PVector":
+        if len(self) == 0:
+            return self
+        return PVector(
+            self._count, self._shift, self._root, self._tail, self._start + 1
+        )
+
+    def _push_tail(self, level: int, parent: list, tail: list) -> list:
+        sub = ((self._count - 1) >> level) & MASK
+        node = parent.copy()
+        if level == BITS:
+            child = tail
+        elif sub < len(parent):
+            child = self._push_tail(level - BITS, parent[sub], tail)
+        else:
+            child = self._new_path(level - BITS, tail)
+        if sub < len(node):
+            node[sub] = child
+        else:
+            node.append(child)
+        return node
+
+    @staticmethod
+    def _new_path(level: int, node: list) -> list:
+        while level > 0:
+            node = [node]
+            level -= BITS
+        return node
@@ -23,7 +23,7 @@ precidences = {
 
 @dataclass
 class Parser:
-    lex: lexer.Lexer
+    lex: lexer.TokenSource
 
     def __post_init__(self) -> None:
         self.next_token()
@@ -36,6 +36,8 @@ class Parser:
         ] = {}
 
         self._errors: List[str] = []
+        # Where in the source each error was found.
+        self._error_offsets: List[int] = []
 
         self.register_prefix(token.INT, self.parse_integer_literal)
         self.register_prefix(token.STRING, self.parse_string_literal)
@@ -65,6 +67,10 @@ class Parser:
     def errors(self):
         return self._errors
 
+    @property
+    def error_offsets(self):
+        return self._error_offsets
+
     @property
     def error_str(self):
         return "\n".join(self._errors)
@@ -72,7 +78,9 @@ class Parser:
     def next_token(self) -> None:
         if hasattr(self, "peek_token"):
             self.curr_token: token.Token = self.peek_token
+            self.curr_offset: int = self.peek_offset
         self.peek_token: token.Token = self.lex.next_token()
+        self.peek_offset: int = self.lex.offset
 
     def register_prefix(
         self, tt: token.TokenType, fn: Callable[[], ast.Expression | None]
@@ -107,12 +115,13 @@ class Parser:
 
     def parse_expression_statement(self) -> ast.ExpressionStatement | None:
         tok = self.curr_token
+        offset = self.curr_offset
         expression = self.parse_expression(LOWEST)
         if self.is_peek_token(token.SEMICOLON):
             self.next_token()
         if expression is None:
             return None
-        return ast.ExpressionStatement(tok, expression)
+        return ast.ExpressionStatement(tok, expression, offset=offset)
 
     def parse_expression(self, precidence: int) -> ast.Expression | None:
         if self.curr_token.token_type not in self.prefix_parse_fns.keys():
@@ -138,9 +147,12 @@ class Parser:
 
     def parse_let_statement(self) -> ast.LetStatement | None:
         tok = self.curr_token
+        offset = self.curr_offset
         if not self.expect_peek(token.IDENT):
             return None
-        name = ast.Identifier(self.curr_token, self.curr_token.literal)
+        name = ast.Identifier(
+            self.curr_token, self.curr_token.literal, offset=self.curr_offset
+        )
         if not self.expect_peek(token.ASSIGN):
             return None
         self.next_token()
@@ -149,62 +161,67 @@ class Parser:
             self.next_token()
         if value is None:
             return None
-        return ast.LetStatement(tok, name, value)
+        return ast.LetStatement(tok, name, value, offset=offset)
 
     def parse_return_statement(self) -> ast.ReturnStatement | None:
         tok = self.curr_token
+        offset = self.curr_offset
         self.next_token()
         value = self.parse_expression(LOWEST)
         if self.is_peek_token(token.SEMICOLON):
             self.next_token()
         if value is None:
             return None
-        return ast.ReturnStatement(tok, value)
+        return ast.ReturnStatement(tok, value, offset=offset)
 
     def parse_identifier(self) -> ast.Expression | None:
-        return ast.Identifier(self.curr_token, self.curr_token.literal)
+        return ast.Identifier(
+            self.curr_token, self.curr_token.literal, offset=self.curr_offset
+        )
 
     def parse_integer_literal(self) -> ast.Expression | None:
         try:
             value = int(self.curr_token.literal)
-            return ast.IntegerLiteral(self.curr_token, value)
+            return ast.IntegerLiteral(self.curr_token, value, offset=self.curr_offset)
         except ValueError:
             self.int_val_error()
             return None
 
     def parse_string_literal(self) -> ast.Expression | None:
         value = self.curr_token.literal
-        return ast.StringLiteral(self.curr_token, value)
+        return ast.StringLiteral(self.curr_token, value, offset=self.curr_offset)
 
     def parse_boolean(self) -> ast.Expression | None:
         try:
             bool_map = {"true": True, "false": False}
             value = bool_map[self.curr_token.literal]
-            return ast.Boolean(self.curr_token, value)
+            return ast.Boolean(self.curr_token, value, offset=self.curr_offset)
         except ValueError:
             self.bool_val_error()
             return None
 
     def parse_prefix_expression(self) -> ast.Expression | None:
         tok = self.curr_token
+        offset = self.curr_offset
         operator = self.curr_token.literal
         self.next_token()
         right = self.parse_expression(PREFIX)
         if right is None:
             return None
-        return ast.PrefixExpression(tok, operator, right)
+        return ast.PrefixExpression(tok, operator, right, offset=offset)
 
     def parse_infix_expression(
         self, left: ast.Expression | None
     ) -> ast.Expression | None:
         tok = self.curr_token
+        offset = self.curr_offset
         operator = self.curr_token.literal
         precidence = self.curr_precidence
         self.next_token()
         right = self.parse_expression(precidence)
         if left is None or right is None:
             return None
-        return ast.InfixExpression(tok, left, operator, right)
+        return ast.InfixExpression(tok, left, operator, right, offset=offset)
 
     def parse_group_expression(self) -> ast.Expression | None:
         self.next_token()
@@ -215,6 +232,7 @@ class Parser:
 
     def parse_if_expression(self) -> ast.Expression | None:
         tok = self.curr_token
+        offset = self.curr_offset
         if not self.expect_peek(token.LPAREN):
             return None
         self.next_token()
@@ -231,10 +249,11 @@ class Parser:
             alternative = self.parse_block_statement()
         else:
             alternative = None
-        return ast.IfExpression(tok, condition, consequence, alternative)
+        return ast.IfExpression(tok, condition, consequence, alternative, offset=offset)
 
     def parse_block_statement(self) -> ast.BlockStatement | None:
         tok = self.curr_token
+        offset = self.curr_offset
         stmts = []
         self.next_token()
 
@@ -249,17 +268,18 @@ class Parser:
             not_rbrace = not self.is_curr_token(token.RBRACE)
             not_eof = not self.is_curr_token(token.EOF)
 
-        return ast.BlockStatement(tok, stmts)
+        return ast.BlockStatement(tok, stmts, offset=offset)
 
     def parse_function_literal(self) -> ast.Expression | None:
         tok = self.curr_token
+        offset = self.curr_offset
         if not self.expect_peek(token.LPAREN):
             return None
         params = self.parse_function_params()
         if not self.expect_peek(token.LBRACE):
             return None
         body = self.parse_block_statement()
-        return ast.FunctionLiteral(tok, params, body)
+        return ast.FunctionLiteral(tok, params, body, offset=offset)
 
     def parse_function_params(self) -> List[ast.Identifier] | None:
         idents: List[ast.Identifier] = []
@@ -270,7 +290,9 @@ class Parser:
 
         while True:
             self.next_token()
-            ident = ast.Identifier(self.curr_token, self.curr_token.literal)
+            ident = ast.Identifier(
+                self.curr_token, self.curr_token.literal, offset=self.curr_offset
+            )
             idents.append(ident)
             if not self.is_peek_token(token.COMMA):
                 break
@@ -304,26 +326,30 @@ class Parser:
 
     def parse_call_expression(self, f: ast.Expression | None) -> ast.Expression | None:
         tok = self.curr_token
+        offset = self.curr_offset
         args = self.parse_expression_list(token.RPAREN)
-        return ast.CallExpression(tok, f, args)
+        return ast.CallExpression(tok, f, args, offset=offset)
 
     def parse_index_expression(
         self, left: ast.Expression | None
     ) -> ast.Expression | None:
         tok = self.curr_token
+        offset = self.curr_offset
         self.next_token()
         index = self.parse_expression(LOWEST)
         if not self.expect_peek(token.RBRACKET):
             return None
-        return ast.IndexExpression(tok, left, index)
+        return ast.IndexExpression(tok, left, index, offset=offset)
 
     def parse_array_literal(self) -> ast.Expression | None:
         tok = self.curr_token
+        offset = self.curr_offset
         elements = self.parse_expression_list(token.RBRACKET)
-        return ast.ArrayLiteral(tok, elements)
+        return ast.ArrayLiteral(tok, elements, offset=offset)
 
     def parser_hash_literal(self) -> ast.Expression | None:
         tok = self.curr_token
+        offset = self.curr_offset
         pairs = dict()
         while not self.is_peek_token(token.RBRACE):
             self.next_token()
@@ -338,7 +364,7 @@ class Parser:
                     return None
         if not self.expect_peek(token.RBRACE):
             return None
-        return ast.HashLiteral(tok, pairs)
+        return ast.HashLiteral(tok, pairs, offset=offset)
 
     def is_curr_token(self, t: token.TokenType) -> bool:
         return self.curr_token.token_type == t
@@ -371,22 +397,26 @@ class Parser:
         else:
             return LOWEST
 
+    def add_error(self, msg: str, offset: int) -> None:
+        self._errors.append(msg)
+        self._error_offsets.append(offset)
+
     def peek_error(self, t: token.TokenType):
         msg = f"Expected next token to be {t}, " f"not {self.peek_token.token_type}."
-        self._errors.append(msg)
+        self.add_error(msg, self.peek_offset)
 
     def int_val_error(self):
         msg = f"Could not parse {self.curr_token.literal} as integer."
-        self._errors.append(msg)
+        self.add_error(msg, self.curr_offset)
 
     def bool_val_error(self):
         msg = f"Could not parse {self.curr_token.literal} as boolean."
-        self._errors.append(msg)
+        self.add_error(msg, self.curr_offset)
 
     def missing_prefix_parse_fn_error(self, t: token.TokenType):
         msg = f"Missing prefix parse function for {t} found."
-        self._errors.append(msg)
+        self.add_error(msg, self.curr_offset)
 
     def missing_infix_parse_fn_error(self, t: token.TokenType):
         msg = f"Missing infix parse function for {t} found."
-        self._errors.append(msg)
+        self.add_error(msg, self.curr_offset)
@@ -2,13 +2,10 @@ import os
 import sys
 from typing import Final, TextIO
 
-from ..code import code
-from ..compiler import compiler, symbols
-from ..eval import eval
+from ..compiler import serial
 from ..lexer import lexer
-from ..obj import env, obj
-from ..parser import parser
-from ..vm import vm
+from ..obj import obj
+from ..session import session
 
 PROMPT: Final[str] = "monke >> "
 
@@ -21,13 +18,77 @@ def log_error(msg: str, details: str, f):
     return
 
 
+def log_session_error(sess: session.Session, rout: TextIO) -> None:
+    match sess.error_stage:
+        case session.PARSE_STAGE:
+            log_error("Parsing Error!", sess.error_str + "\n:(", rout)
+        case session.COMPILE_STAGE:
+            log_error("Failed to Compile!", sess.error_str + "\n:(", rout)
+        case session.RUNTIME_STAGE if sess.mode == "interp":
+            details = "\n".join([e.inspect for e in sess.errors])
+            log_error("Runtime Error!", details + "\n:(", rout)
+        case session.RUNTIME_STAGE:
+            log_error("VM Error!", sess.error_str + "\n:(", rout)
+
+
+def run_file(
+    src_code: str | lexer.SeekableStream,
+    mode: str,
+    path: str | None = None,
+    rout: TextIO = sys.stdout,
+) -> obj.Object | None:
+    """Run a whole script, given as text or a file to lex as it is read.
+
+    In vm mode, reuse or refresh the .mkc next to path. A file is read twice
+    then, once to hash it for the .mkc and again if it has to be parsed.
+    """
+    if mode not in session.MODES:
+        print(f"unsupported mode: {mode}", file=rout)
+        return None
+    sess = session.Session(mode, cache_size=0)
+    if mode == "interp" or path is None:
+        result = sess.run(src_code)
+    elif isinstance(src_code, str):
+        sess.source = src_code
+        digest = serial.source_hash(src_code)
+        result = run_cached(sess, src_code, path, digest)
+    else:
+        start = src_code.tell()
+        digest = serial.stream_hash(src_code)
+        src_code.seek(start)
+        result = run_cached(sess, src_code, path, digest)
+        if result is None and sess.lines is None:
+            # Ran from the .mkc, so the source wasn't read for its lines.
+            src_code.seek(start)
+            sess.lines = lexer.index_lines(src_code)
+    if result is None:
+        log_session_error(sess, rout)
+    return result
+
+
+def run_cached(
+    sess: session.Session, src_code: str | lexer.Stream, path: str, digest: bytes
+) -> obj.Object | None:
+    bytecode = serial.read_cache(path, digest=digest)
+    if bytecode is None:
+        program = sess.parse(src_code)
+        if program is not None:
+            bytecode = sess.compile(program)
+        if bytecode is not None:
+            serial.write_cache(path, "", bytecode, digest=digest)
+    return sess.execute(bytecode) if bytecode is not None else None
+
+
 def start(
-    rin: TextIO = sys.stdin, mode: str = "interp", rout: TextIO = sys.stdout
+    rin: TextIO = sys.stdin,
+    mode: str = "vm",
+    rout: TextIO = sys.stdout,
+    path: str | None = None,
 ) -> None:
-    e = env.Environment()
-    table = symbols.Table()
-    constants: list[obj.Object] = []
-    globals: list[obj.Object] = vm.build_new_globals()
+    if mode not in session.MODES:
+        print(f"unsupported mode: {mode}", file=rout)
+        return
+    sess = session.Session(mode)
 
     if rin == sys.stdin:
         print(PROMPT, end="", flush=True, file=rout)
@@ -39,42 +100,15 @@ def start(
             elif user_input.strip() == "clear":
                 os.system("cls" if os.name == "nt" else "clear")
             else:
-                lex = lexer.Lexer(user_input)
-                par = parser.Parser(lex)
-                program = par.parse_program()
-
-                if len(par.errors):
-                    log_error("Parsing Error!", par.error_str + "\n:(", rout)
+                result = sess.run(user_input)
+                if result is None:
+                    log_session_error(sess, rout)
+                elif mode == "interp":
+                    print("[Output] " + result.inspect + "\n", file=rout)
                 else:
-                    if mode == "interp":
-                        evaluated = eval.eval(program, e)
-                        if evaluated is not None:
-                            print("[Output] " + evaluated.inspect + "\n", file=rout)
-                    elif mode == "vm":
-                        comp = compiler.Compiler(constants, table)
-                        comp.compile(program)
-                        if len(comp.errors):
-                            log_error(
-                                "Failed to Compile!", comp.error_str + "\n:(", rout
-                            )
-                        else:
-                            machine = vm.VirtualMachine(comp.bytecode, globals)
-                            machine.run()
-                            if len(machine.errors):
-                                log_error("VM Error!", machine.error_str + "\n:(", rout)
-                            elif machine.last_popped:
-                                print(
-                                    "[Output]: " + machine.last_popped.inspect + "\n",
-                                    file=rout,
-                                )
-                    else:
-                        print(f"unsupported mode: {mode}", file=rout)
+                    print("[Output]: " + result.inspect + "\n", file=rout)
 
             print(PROMPT, end="", flush=True, file=rout)
             user_input = rin.readline()
     else:
-        src_code = "".join(rin.readlines())
-        lex = lexer.Lexer(src_code)
-        par = parser.Parser(lex)
-        program = par.parse_program()
-        _ = eval.eval(program, e)
+        run_file(rin, mode, path, rout)
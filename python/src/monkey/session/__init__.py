@@ -0,0 +1,2 @@
+from .cache import ProgramCache
+from .session import Session
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from ..compiler import compiler, symbols
+
+
+@dataclass
+class CachedProgram:
+    """Bytecode compiled against a particular state of a global symbol table.
+
+    depends maps each global name the compiler looked up to the symbol it found
+    (None if undefined), and defines holds the symbols the program added, which
+    were numbered from first_def up to n_def. The bytecode is only valid while
+    those lookups still give the same symbols.
+    """
+
+    bytecode: compiler.Bytecode
+    depends: dict[str, symbols.Symbol | None]
+    defines: dict[str, symbols.Symbol]
+    first_def: int
+    n_def: int
+
+    def valid_for(self, table: symbols.Table) -> bool:
+        store = table.store
+        for name, sym in self.depends.items():
+            if store.get(name) != sym:
+                return False
+        return not self.defines or table.n_def == self.first_def
+
+
+class ProgramCache:
+    """LRU cache from source text to the bytecode compiled from it.
+
+    Entries refer to the constant pool of the table's compiler, so a cache must
+    only be used with the one symbol table and constant pool it was filled from.
+    """
+
+    def __init__(self, size: int = 128) -> None:
+        if size < 1:
+            raise ValueError(f"cache size must be positive: {size}")
+        self.size: int = size
+        self.entries: OrderedDict[str, CachedProgram] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, source: str, table: symbols.Table) -> compiler.Bytecode | None:
+        """Return cached bytecode for source, defining its globals in table."""
+        entry = self.entries.get(source)
+        if entry is None or not entry.valid_for(table):
+            self.misses += 1
+            return None
+        self.entries.move_to_end(source)
+        self.hits += 1
+        table.store.update(entry.defines)
+        table.n_def = entry.n_def
+        return entry.bytecode
+
+    def put(self, source: str, entry: CachedProgram) -> None:
+        self.entries[source] = entry
+        self.entries.move_to_end(source)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
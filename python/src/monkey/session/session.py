@@ -0,0 +1,228 @@
+from typing import Final
+
+from ..ast import ast
+from ..compiler import compiler, symbols
+from ..eval import eval
+from ..fold import fold
+from ..lexer import lexer
+from ..obj import env, obj
+from ..parser import parser
+from ..vm import vm
+from . import cache
+
+MODES: Final[tuple[str, ...]] = ("vm", "interp")
+
+# Stage of the last failed run, see Session.error_stage.
+PARSE_STAGE: Final[str] = "parse"
+COMPILE_STAGE: Final[str] = "compile"
+RUNTIME_STAGE: Final[str] = "runtime"
+
+# Host limits a program can run into, the VM's frame stack or Python's
+# recursion limit running out. They are reported as runtime errors.
+RUNTIME_EXCEPTIONS: Final[tuple[type[Exception], ...]] = (
+    OverflowError,
+    RecursionError,
+)
+
+
+class Session:
+    """Runs snippets of Monkey code one after another against shared state.
+
+    Definitions made by one run are visible to the next, as in the REPL. In vm
+    mode the session keeps the symbol table, constant pool, globals and one
+    VirtualMachine warm between runs; in interp mode it keeps an Environment.
+
+    In vm mode, up to cache_size recently compiled programs are kept so running
+    the same source again skips parsing and compiling. 0 turns the cache off.
+    """
+
+    def __init__(self, mode: str = "vm", cache_size: int = 128) -> None:
+        if mode not in MODES:
+            raise ValueError(f"unsupported mode: {mode}")
+        self.mode: str = mode
+        self.env: env.Environment = env.Environment()
+        self.table: symbols.Table = symbols.Table()
+        self.constants: list[obj.Object] = []
+        # Index of constants for the compiler, kept with the pool it indexes.
+        self.constant_index: dict[tuple, int] = {}
+        self.globals: list[obj.Object] = vm.build_new_globals()
+        self.machine: vm.VirtualMachine | None = None
+        self.cache: cache.ProgramCache | None = None
+        if cache_size > 0 and mode == "vm":
+            self.cache = cache.ProgramCache(cache_size)
+        self._errors: list[obj.Error] = []
+        self.error_stage: str | None = None
+        # The source being run, which error offsets point into. A streamed
+        # source isn't kept, only where its lines start.
+        self.source: str = ""
+        self.lines: lexer.LineIndex | None = None
+
+    @property
+    def errors(self):
+        return self._errors
+
+    @property
+    def error_str(self):
+        """The errors, each prefixed with its line and column when known.
+
+        Errors in code compiled from an earlier run's source have no location in
+        this one, so none is given.
+        """
+        index = self.lines if self.lines is not None else lexer.LineIndex(self.source)
+        out = []
+        for e in self._errors:
+            if e.offset >= 0 and e.source in (None, self.source_key):
+                out.append(f"{index.describe(e.offset)}: {e.message}")
+            else:
+                out.append(e.message)
+        return "\n".join(out)
+
+    @property
+    def source_key(self) -> object:
+        """What code compiled from the current source records as its source."""
+        return self.lines if self.lines is not None else self.source
+
+    def run(self, source: str | lexer.Stream) -> obj.Object | None:
+        """Run source and return its value, or None if it failed.
+
+        source may also be a file object or mmap, which is lexed as it is read
+        and bypasses the program cache. On failure errors and error_stage
+        describe what went wrong. A program that fails to parse or compile
+        leaves the session as it was.
+        """
+        self._errors = []
+        self.error_stage = None
+        self.source = source if isinstance(source, str) else ""
+        self.lines = None
+        if self.mode == "interp":
+            program = self.parse(source)
+            if program is None:
+                return None
+            return self.evaluate(program)
+        bytecode = None
+        if self.cache is not None and isinstance(source, str):
+            bytecode = self.cache.get(source, self.table)
+        if bytecode is None:
+            program = self.parse(source)
+            if program is None:
+                return None
+            key = source if isinstance(source, str) else None
+            bytecode = self.compile(program, key)
+            if bytecode is None:
+                return None
+        return self.execute(bytecode)
+
+    def define(self, name: str, value: obj.Object) -> None:
+        """Bind a global, as `let name = value;` would, from outside the language.
+
+        Rebinding a global keeps its slot, so cached programs that use it stay
+        valid.
+        """
+        if self.mode == "interp":
+            self.env.set(name, value)
+            return
+        sym = self.table.store.get(name)
+        if sym is None or sym.scope != symbols.GLOBAL_SCOPE:
+            sym = self.table.define(name)
+        if sym.index >= len(self.globals):
+            self.globals.extend([obj.NULL] * (sym.index + 1 - len(self.globals)))
+        self.globals[sym.index] = value
+
+    def parse(self, source: str | lexer.Stream) -> ast.Program | None:
+        lex: lexer.TokenSource
+        if isinstance(source, str):
+            self.source, self.lines = source, None
+            lex = lexer.new_lexer(source)
+        else:
+            stream = lexer.StreamLexer(source)
+            self.source, self.lines = "", stream.lines
+            lex = stream
+        par = parser.Parser(lex)
+        program = par.parse_program()
+        if len(par.errors):
+            errors = zip(par.errors, par.error_offsets)
+            self.fail(PARSE_STAGE, [obj.Error(e, offset) for e, offset in errors])
+            return None
+        return fold.fold(program)
+
+    def compile(
+        self, program: ast.Program, source: str | None = None
+    ) -> compiler.Bytecode | None:
+        """Compile program into the session, caching the result under source."""
+        # The compiler defines symbols and adds constants as it goes, so undo
+        # them if it gives up part way through.
+        n_def = self.table.n_def
+        n_constants = len(self.constants)
+        self.table.resolved = set()
+        self.table.changed = {}
+        try:
+            comp = compiler.Compiler(
+                self.constants,
+                self.table,
+                optimize=True,
+                constant_index=self.constant_index,
+                source=self.source_key,
+            )
+            comp.compile(program)
+        finally:
+            resolved, self.table.resolved = self.table.resolved, None
+            changed, self.table.changed = self.table.changed, None
+        if len(comp.errors):
+            for name, old in changed.items():
+                if old is None:
+                    del self.table.store[name]
+                else:
+                    self.table.store[name] = old
+            self.table.n_def = n_def
+            del self.constants[n_constants:]
+            # New constants were indexed last, in the order they were added.
+            index = self.constant_index
+            while index and next(reversed(index.values())) >= n_constants:
+                index.popitem()
+            self.fail(COMPILE_STAGE, comp.errors)
+            return None
+        bytecode = comp.bytecode
+        if self.cache is not None and source is not None:
+            store = self.table.store
+            defines = {
+                name: store[name] for name, old in changed.items() if store[name] != old
+            }
+            depends = {
+                name: changed[name] if name in changed else store.get(name)
+                for name in resolved
+            }
+            entry = cache.CachedProgram(
+                bytecode, depends, defines, n_def, self.table.n_def
+            )
+            self.cache.put(source, entry)
+        return bytecode
+
+    def execute(self, bytecode: compiler.Bytecode) -> obj.Object | None:
+        if self.machine is None:
+            self.machine = vm.VirtualMachine(bytecode, self.globals)
+        else:
+            self.machine.reset(bytecode, self.globals)
+        try:
+            self.machine.run()
+        except RUNTIME_EXCEPTIONS as e:
+            self.fail(RUNTIME_STAGE, [obj.Error(str(e))])
+            return None
+        if len(self.machine.errors):
+            self.fail(RUNTIME_STAGE, self.machine.errors)
+            return None
+        return self.machine.last_popped
+
+    def evaluate(self, program: ast.Program) -> obj.Object | None:
+        try:
+            evaluated = eval.eval(program, self.env)
+        except RUNTIME_EXCEPTIONS as e:
+            self.fail(RUNTIME_STAGE, [obj.Error(str(e))])
+            return None
+        if isinstance(evaluated, obj.Error):
+            self.fail(RUNTIME_STAGE, [evaluated])
+            return None
+        return evaluated
+
+    def fail(self, stage: str, errors: list[obj.Error]) -> None:
+        self.error_stage = stage
+        self._errors = list(errors)
@@ -37,6 +37,42 @@ IF: Final[TokenType] = TokenType("IF")
 ELSE: Final[TokenType] = TokenType("ELSE")
 RETURN: Final[TokenType] = TokenType("RETURN")
 
+# Every token type, indexed by the small integer codes used in token arrays.
+TOKEN_TYPES: Final[tuple[TokenType, ...]] = (
+    ILLEGAL,
+    EOF,
+    IDENT,
+    INT,
+    STRING,
+    ASSIGN,
+    PLUS,
+    MINUS,
+    BANG,
+    ASTERISK,
+    SLASH,
+    LT,
+    GT,
+    EQ,
+    NOT_EQ,
+    COMMA,
+    SEMICOLON,
+    COLON,
+    LPAREN,
+    RPAREN,
+    LBRACE,
+    RBRACE,
+    LBRACKET,
+    RBRACKET,
+    FUNCTION,
+    LET,
+    TRUE,
+    FALSE,
+    IF,
+    ELSE,
+    RETURN,
+)
+TYPE_CODES: Final[dict[TokenType, int]] = {t: i for i, t in enumerate(TOKEN_TYPES)}
+
 
 KEYWORDS: Final[dict[str, TokenType]] = {
     "fn": FUNCTION,
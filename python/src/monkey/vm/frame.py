@@ -11,4 +11,4 @@ class Frame:
 
     @property
     def instructions(self):
-        return self.cl.fn.instructions
+        return self.cl.fn.decoded
@@ -1,50 +1,76 @@
-from typing import Final, cast
+from typing import Callable, Final, cast
 
 from ..code import code
 from ..compiler import compiler
 from ..obj import obj, builtin
 from . import frame
 
-STACK_SIZE: Final[int] = 2048
+# Most globals SetGlobal/GetGlobal's 2-byte operand can address.
 GLOBAL_SIZE: Final[int] = 2**16
 MAX_FRAMES: Final[int] = 2**10
+DISPATCH_MODES: Final[tuple[str, ...]] = ("match", "table")
 
 
-def build_new_globals() -> list[obj.Object]:
-    return [obj.NULL] * GLOBAL_SIZE
-
-
-def build_new_stack() -> list[obj.Object]:
-    return [obj.NULL] * STACK_SIZE
-
-
-def build_new_frames() -> list[frame.Frame]:
-    return [
-        frame.Frame(obj.Closure(obj.CompiledFunction(bytearray(0), 0, 0), []))
-    ] * MAX_FRAMES
+def build_new_globals(size: int = 0) -> list[obj.Object]:
+    """Return a globals store; VMs given it grow it to fit their bytecode."""
+    return [obj.NULL] * size
 
 
 def new_error(msg: str) -> obj.Error:
     return obj.Error(msg)
 
 
+def operator_error(op: str, left: obj.Object, right: obj.Object) -> obj.Error:
+    if left.otype != right.otype:
+        return new_error(f"type mismatch: {left.otype} {op} {right.otype}")
+    return new_error(f"unknown operator: {left.otype} {op} {right.otype}")
+
+
 class VirtualMachine:
     def __init__(
         self,
         bytecode: compiler.Bytecode,
-        globals: list[obj.Object] = build_new_globals(),
+        globals: list[obj.Object] | None = None,
+        dispatch: str = "match",
     ) -> None:
-        self.stack: list[obj.Object] = build_new_stack()
-        self.sp: int = 0
+        """Prepare to run bytecode.
+
+        Each VM gets its own globals unless a store is passed in to share, e.g.
+        between REPL lines. A shared store is grown in place to fit bytecode.
+        """
+        if dispatch not in DISPATCH_MODES:
+            raise ValueError(f"unknown dispatch mode: {dispatch}")
+        self.dispatch: str = dispatch
+        # Grown on demand as frames are entered, see ensure_stack.
+        self.stack: list[obj.Object] = []
+        # How much of the stack runs since the last reset may have used.
+        self.high_water: int = 0
+        self.frames: list[frame.Frame] = []
+        self.reset(bytecode, globals)
+
+    def reset(
+        self, bytecode: compiler.Bytecode, globals: list[obj.Object] | None = None
+    ) -> None:
+        """Load new bytecode, keeping the stack allocated by earlier runs.
 
-        self.frames: list[frame.Frame] = build_new_frames()
-        main_fn = obj.CompiledFunction(bytecode.instructions, 0, 0)
-        main_closure = obj.Closure(main_fn, [])
-        main_frame = frame.Frame(main_closure)
-        self.frames[0] = main_frame
+        The part of the stack the last run used is cleared, so its values are
+        neither kept alive nor mistaken for this run's result.
+        """
+        self.sp: int = 0
+        self.stack[: self.high_water] = [obj.NULL] * self.high_water
+        self.high_water = 0
+        self.frames.clear()
+        self.frames.append(frame.Frame(obj.Closure(bytecode.main_fn, [])))
         self.fp: int = 1
 
         self.constants: list[obj.Object] = bytecode.constants
+        n_globals = bytecode.globals_size
+        if n_globals > GLOBAL_SIZE:
+            raise OverflowError("Too many globals.")
+        if globals is None:
+            globals = build_new_globals(n_globals)
+        elif len(globals) < n_globals:
+            globals.extend([obj.NULL] * (n_globals - len(globals)))
         self.globals: list[obj.Object] = globals
         self._errors: list[obj.Error] = []
 
@@ -57,15 +83,22 @@ class VirtualMachine:
         return self.frames[self.fp - 1]
 
     def push_frame(self, f: frame.Frame) -> None:
-        if self.fp > MAX_FRAMES:
+        if self.fp >= MAX_FRAMES:
             raise OverflowError("Frame stack overflow.")
-        self.frames[self.fp] = f
+        self.frames.append(f)
         self.fp += 1
 
     def pop_frame(self) -> frame.Frame:
-        f = self.frames[self.fp - 1]
         self.fp -= 1
-        return f
+        return self.frames.pop()
+
+    def ensure_stack(self, size: int) -> None:
+        if size <= self.high_water:
+            return
+        self.high_water = size
+        if len(self.stack) < size:
+            grow = max(size, 2 * len(self.stack)) - len(self.stack)
+            self.stack.extend([obj.NULL] * grow)
 
     @property
     def instructions(self):
@@ -99,8 +132,6 @@ class VirtualMachine:
         return self.stack[self.sp]
 
     def push(self, o: obj.Object) -> None:
-        if self.sp > STACK_SIZE:
-            raise OverflowError("Stack overflow.")
         self.stack[self.sp] = o
         self.sp += 1
 
@@ -124,17 +155,17 @@ class VirtualMachine:
         self.sp -= n_elems
         return array
 
-    def pop_hash(self, n_keyval: int) -> dict[obj.Object, obj.Object]:
-        keyvals = self.stack[self.sp - n_keyval : self.sp].copy()
+    def pop_hash(self, n_keyval: int) -> obj.PMap:
+        keyvals = self.stack[self.sp - n_keyval : self.sp]
         self.sp -= n_keyval
-        hash = dict(map(lambda k, v: (k, v), keyvals[::2], keyvals[1::2]))
-        return hash
+        return obj.PMap.from_pairs(zip(keyvals[::2], keyvals[1::2]))
 
     def call_closure(self, cl: obj.Closure, n_args: int):
         if n_args != cl.fn.n_params:
             self._errors.append(new_error("incorrect number of args"))
         f = frame.Frame(cl, bp=self.sp - n_args)
         self.push_frame(f)
+        self.ensure_stack(f.bp + cl.fn.frame_size)
         self.sp = f.bp + cl.fn.n_locals
 
     def call_builtin(self, fn: obj.BuiltIn, n_args: int):
@@ -154,217 +185,638 @@ class VirtualMachine:
             case obj.BuiltIn():
                 self.call_builtin(callee, n_args)
 
+    def execute_tail_call(self, n_args: int):
+        """Call a closure in the current frame, reusing its stack window."""
+        callee = self.stack[self.sp - 1 - n_args]
+        if not isinstance(callee, obj.Closure):
+            self.execute_call(n_args)
+            return
+        if n_args != callee.fn.n_params:
+            self._errors.append(new_error("incorrect number of args"))
+            return
+        f = self.curr_frame
+        self.stack[f.bp - 1 : f.bp + n_args] = self.stack[
+            self.sp - 1 - n_args : self.sp
+        ]
+        f.cl = callee
+        f.ip = 0
+        self.ensure_stack(f.bp + callee.fn.frame_size)
+        self.sp = f.bp + callee.fn.n_locals
+
     def run(self) -> None:
-        while self.ip < len(self.instructions):
-            if len(self._errors) > 0:
+        self.ensure_stack(self.sp + self.curr_frame.cl.fn.frame_size)
+        if self.dispatch == "table":
+            self.run_table()
+        else:
+            self.run_match()
+        if self._errors and self._errors[-1].offset < 0:
+            error = self._errors[-1]
+            error.offset, error.source = self.error_location()
+
+    def error_location(self) -> tuple[int, object]:
+        """Where execution stopped: a source offset, or -1, and its source.
+
+        Only worked out once a run fails, from the line tables of the functions
+        on the frame stack.
+        """
+        for f in reversed(self.frames[: self.fp]):
+            # A frame that hasn't started yet failed in its caller's Call.
+            if f.ip > 0:
+                fn = f.cl.fn
+                return fn.offset_at(f.ip - 1), fn.source
+        return -1, None
+
+    def run_table(self) -> None:
+        handlers = HANDLERS
+        while self.fp > 0 and not self._errors:
+            f = self.frames[self.fp - 1]
+            insts = f.cl.fn.decoded
+            if f.ip >= len(insts):
                 break
-            op = code.OpCode(self.instructions[self.ip].to_bytes(1, "big"))
-            self.ip += 1
-            match op:
-                case code.OpCode.PConstant:
-                    const_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 2], "big"
-                    )
-                    self.ip += 2
-                    self.push(self.constants[const_idx])
-                case code.OpCode.Add:
-                    right = self.pop()
-                    left = self.pop()
+            ins = insts[f.ip]
+            f.ip += 1
+            handlers[ins[0]](self, ins)
+
+    def run_match(self) -> None:
+        # Hot opcodes are handled inline, everything else falls back to HANDLERS.
+        # The current frame's state lives in locals while executing and is only
+        # written back to self/the frame when a call or return switches frames.
+        Op = code.Op
+        f = self.curr_frame
+        insts = f.instructions
+        ip = f.ip
+        bp = f.bp
+        stack = self.stack
+        sp = self.sp
+        constants = self.constants
+        globals = self.globals
+        new_integer = obj.new_integer
+        builtins = [b.fn for b in builtin.BuiltIns]
+        while ip < len(insts):
+            ins = insts[ip]
+            ip += 1
+            match ins[0]:
+                case Op.GetLocal:
+                    stack[sp] = stack[bp + ins[1]]
+                    sp += 1
+                case Op.PConstant:
+                    stack[sp] = constants[ins[1]]
+                    sp += 1
+                case Op.JumpNT:
+                    sp -= 1
+                    condition = stack[sp]
+                    if condition is obj.FALSE or condition is obj.NULL:
+                        ip = ins[1]
+                case Op.Jump:
+                    ip = ins[1]
+                case Op.GetGlobal:
+                    stack[sp] = globals[ins[1]]
+                    sp += 1
+                case Op.Equal:
+                    sp -= 1
+                    right = stack[sp]
+                    left = stack[sp - 1]
+                    if left is right:
+                        result = obj.TRUE
+                    elif isinstance(left, obj.Integer) and isinstance(
+                        right, obj.Integer
+                    ):
+                        result = obj.TRUE if left.value == right.value else obj.FALSE
+                    else:
+                        result = obj.TRUE if left == right else obj.FALSE
+                    stack[sp - 1] = result
+                case Op.Add:
+                    sp -= 1
+                    right = stack[sp]
+                    left = stack[sp - 1]
                     if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
-                        int_result = left.value + right.value
-                        self.push(obj.Integer(int_result))
+                        stack[sp - 1] = new_integer(left.value + right.value)
                     elif isinstance(left, obj.String) and isinstance(right, obj.String):
-                        str_result: str = left.value + right.value
-                        self.push(obj.String(str_result))
+                        stack[sp - 1] = obj.String(left.value + right.value)
                     else:
-                        self.push(obj.NULL)
-                case code.OpCode.Sub:
-                    right = self.pop()
-                    left = self.pop()
-                    if hasattr(left, "value") and hasattr(right, "value"):
-                        result = left.value - right.value
+                        stack[sp - 1] = obj.NULL
+                case Op.Sub:
+                    sp -= 1
+                    right = stack[sp]
+                    left = stack[sp - 1]
+                    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+                        stack[sp - 1] = new_integer(left.value - right.value)
                     else:
-                        result = obj.NULL
-                    self.push(obj.Integer(result))
-                case code.OpCode.Mul:
-                    right = self.pop()
-                    left = self.pop()
-                    if hasattr(left, "value") and hasattr(right, "value"):
-                        result = left.value * right.value
+                        self._errors.append(operator_error("-", left, right))
+                        break
+                case Op.Call | Op.TailCall:
+                    n_args = ins[1]
+                    callee = stack[sp - 1 - n_args]
+                    # Inline cache: ins[2] holds the last CompiledFunction or
+                    # builtin called here, whose arity is known to fit. Closures
+                    # aren't kept, so a site doesn't hold on to their free
+                    # variables; a rebound global simply misses.
+                    cache = ins[2]
+                    if callee is cache[0]:
+                        fn = None
+                    elif isinstance(callee, obj.Closure):
+                        fn = callee.fn
+                        if fn is not cache[0]:
+                            if n_args != fn.n_params:
+                                f.ip = ip
+                                self.sp = sp
+                                self._errors.append(
+                                    new_error("incorrect number of args")
+                                )
+                                break
+                            cache[0] = fn
+                    elif isinstance(callee, obj.BuiltIn):
+                        fn = None
+                        cache[0] = callee
                     else:
-                        result = obj.NULL
-                    self.push(obj.Integer(result))
-                case code.OpCode.Div:
-                    right = self.pop()
-                    left = self.pop()
-                    if hasattr(left, "value") and hasattr(right, "value"):
-                        result = left.value // right.value
+                        f.ip = ip
+                        self.sp = sp
+                        self.execute_call(n_args)
+                        sp = self.sp
+                        continue
+                    if fn is None:
+                        result = callee.fn(*stack[sp - n_args : sp])
+                        sp -= n_args + 1
+                        stack[sp] = obj.NULL if result is None else result
+                        sp += 1
+                    elif ins[0] == Op.Call:
+                        f.ip = ip
+                        self.sp = sp
+                        f = frame.Frame(callee, bp=sp - n_args)
+                        self.push_frame(f)
+                        insts = fn.decoded
+                        ip = 0
+                        bp = f.bp
+                        sp = bp + fn.n_locals
+                        if bp + fn.frame_size > self.high_water:
+                            self.ensure_stack(bp + fn.frame_size)
                     else:
-                        result = obj.NULL
-                    self.push(obj.Integer(result))
-                case code.OpCode.PTrue:
-                    self.push(obj.TRUE)
-                case code.OpCode.PFalse:
-                    self.push(obj.FALSE)
-                case code.OpCode.Pop:
-                    self.pop()
-                case code.OpCode.Equal:
-                    right = self.pop()
-                    left = self.pop()
-                    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+                        stack[bp - 1 : bp + n_args] = stack[sp - 1 - n_args : sp]
+                        f.cl = callee
+                        insts = fn.decoded
+                        ip = 0
+                        sp = bp + fn.n_locals
+                        if bp + fn.frame_size > self.high_water:
+                            self.ensure_stack(bp + fn.frame_size)
+                case Op.ReturnValue | Op.Return:
+                    if ins[0] == Op.ReturnValue:
+                        value = stack[sp - 1]
+                    else:
+                        value = obj.NULL
+                    self.pop_frame()
+                    sp = bp - 1
+                    stack[sp] = value
+                    sp += 1
+                    if self.fp == 0:
+                        break
+                    f = self.curr_frame
+                    insts = f.instructions
+                    ip = f.ip
+                    bp = f.bp
+                case Op.GetLocalGetLocal:
+                    stack[sp] = stack[bp + ins[1]]
+                    stack[sp + 1] = stack[bp + ins[2]]
+                    sp += 2
+                case Op.GetLocalPConstantEqual:
+                    left = stack[bp + ins[1]]
+                    right = constants[ins[2]]
+                    if left is right:
+                        result = obj.TRUE
+                    elif isinstance(left, obj.Integer) and isinstance(
+                        right, obj.Integer
+                    ):
                         result = obj.TRUE if left.value == right.value else obj.FALSE
                     else:
                         result = obj.TRUE if left == right else obj.FALSE
-                    self.push(result)
-                case code.OpCode.NotEqual:
-                    right = self.pop()
-                    left = self.pop()
+                    stack[sp] = result
+                    sp += 1
+                case Op.EqualJumpNT:
+                    sp -= 2
+                    left = stack[sp]
+                    right = stack[sp + 1]
+                    if left is right:
+                        equal = True
+                    elif isinstance(left, obj.Integer) and isinstance(
+                        right, obj.Integer
+                    ):
+                        equal = left.value == right.value
+                    else:
+                        equal = left == right
+                    if not equal:
+                        ip = ins[1]
+                case Op.PConstantSub:
+                    left = stack[sp - 1]
+                    right = constants[ins[1]]
+                    if isinstance(left, obj.Integer):
+                        stack[sp - 1] = new_integer(left.value - right.value)
+                    else:
+                        self._errors.append(operator_error("-", left, right))
+                        break
+                case Op.PConstantAdd:
+                    left = stack[sp - 1]
+                    right = constants[ins[1]]
+                    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+                        stack[sp - 1] = new_integer(left.value + right.value)
+                    elif isinstance(left, obj.String) and isinstance(right, obj.String):
+                        stack[sp - 1] = obj.String(left.value + right.value)
+                    else:
+                        stack[sp - 1] = obj.NULL
+                case Op.SetLocal:
+                    sp -= 1
+                    stack[bp + ins[1]] = stack[sp]
+                case Op.GetFree:
+                    stack[sp] = f.cl.free[ins[1]]
+                    sp += 1
+                case Op.GetBuiltIn:
+                    stack[sp] = builtins[ins[1]]
+                    sp += 1
+                case Op.CurrentClosure:
+                    stack[sp] = f.cl
+                    sp += 1
+                case Op.Pop:
+                    if sp > 0:
+                        sp -= 1
+                case Op.SetGlobal:
+                    sp -= 1
+                    globals[ins[1]] = stack[sp]
+                case Op.PTrue:
+                    stack[sp] = obj.TRUE
+                    sp += 1
+                case Op.PFalse:
+                    stack[sp] = obj.FALSE
+                    sp += 1
+                case Op.PNull:
+                    stack[sp] = obj.NULL
+                    sp += 1
+                case Op.Mul:
+                    sp -= 1
+                    right = stack[sp]
+                    left = stack[sp - 1]
                     if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+                        stack[sp - 1] = new_integer(left.value * right.value)
+                    else:
+                        self._errors.append(operator_error("*", left, right))
+                        break
+                case Op.Div:
+                    sp -= 1
+                    right = stack[sp]
+                    left = stack[sp - 1]
+                    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+                        if not right.value:
+                            self._errors.append(new_error("division by zero"))
+                            break
+                        stack[sp - 1] = new_integer(left.value // right.value)
+                    else:
+                        self._errors.append(operator_error("/", left, right))
+                        break
+                case Op.NotEqual:
+                    sp -= 1
+                    right = stack[sp]
+                    left = stack[sp - 1]
+                    if left is right:
+                        result = obj.FALSE
+                    elif isinstance(left, obj.Integer) and isinstance(
+                        right, obj.Integer
+                    ):
                         result = obj.TRUE if left.value != right.value else obj.FALSE
                     else:
                         result = obj.TRUE if left != right else obj.FALSE
-                    self.push(result)
-                case code.OpCode.GreaterThan:
-                    right = self.pop()
-                    left = self.pop()
-                    if hasattr(left, "value") and hasattr(right, "value"):
+                    stack[sp - 1] = result
+                case Op.GreaterThan:
+                    sp -= 1
+                    right = stack[sp]
+                    left = stack[sp - 1]
+                    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
                         result = obj.TRUE if left.value > right.value else obj.FALSE
                     else:
-                        result = obj.NULL
-                    self.push(result)
-                case code.OpCode.Minus:
-                    value = self.pop()
-                    if hasattr(value, "value"):
-                        result = -value.value
+                        self._errors.append(operator_error(">", left, right))
+                        break
+                    stack[sp - 1] = result
+                case Op.Minus:
+                    value = stack[sp - 1]
+                    if isinstance(value, obj.Integer):
+                        stack[sp - 1] = new_integer(-value.value)
                     else:
-                        result = obj.NULL
-                    self.push(obj.Integer(result))
-                case code.OpCode.Bang:
-                    value = self.pop()
+                        self._errors.append(
+                            new_error(f"unknown operator: -{value.otype}")
+                        )
+                        break
+                case Op.Bang:
+                    value = stack[sp - 1]
                     if hasattr(value, "value"):
                         result = obj.TRUE if not value.value else obj.FALSE
                     elif value is obj.NULL:
                         result = obj.TRUE
                     else:
                         result = obj.NULL
-                    self.push(result)
-                case code.OpCode.Jump:
-                    const_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 2], "big"
-                    )
-                    self.ip = const_idx
-                case code.OpCode.JumpNT:
-                    const_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 2], "big"
-                    )
-                    self.ip += 2
-                    condition = self.pop()
-                    if condition in [obj.FALSE, obj.NULL]:
-                        self.ip = const_idx
-                case code.OpCode.PNull:
-                    self.push(obj.NULL)
-                case code.OpCode.SetGlobal:
-                    global_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 2], "big"
-                    )
-                    self.ip += 2
-                    value = self.pop()
-                    self.globals[global_idx] = value
-                case code.OpCode.GetGlobal:
-                    global_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 2], "big"
-                    )
-                    self.ip += 2
-                    self.push(self.globals[global_idx])
-                case code.OpCode.PArray:
-                    n_elems = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 2], "big"
-                    )
-                    self.ip += 2
-                    array = self.pop_array(n_elems)
-                    self.push(obj.Array(array))
-                case code.OpCode.PHash:
-                    n_keyval = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 2], "big"
-                    )
-                    self.ip += 2
-                    hash = self.pop_hash(n_keyval)
-                    self.push(obj.Hash(hash))
-                case code.OpCode.Index:
-                    index = self.pop()
-                    left = self.pop()
+                    stack[sp - 1] = result
+                case Op.Index:
+                    sp -= 1
+                    index = stack[sp]
+                    left = stack[sp - 1]
+                    result = obj.NULL
                     if isinstance(left, obj.Array) and isinstance(index, obj.Integer):
                         idx = index.value
                         arr = left.elements
-                        if (idx < -len(arr)) or (idx >= len(arr)):
-                            self.push(obj.NULL)
-                        else:
-                            self.push(arr[idx % len(arr)])
+                        if -len(arr) <= idx < len(arr):
+                            result = arr[idx % len(arr)]
                     elif isinstance(left, obj.Hash):
-                        key = index
-                        hash = left.pairs
-                        if key not in hash.keys():
-                            self.push(obj.NULL)
-                        else:
-                            self.push(hash[key])
-                    else:
-                        self.push(obj.NULL)
-                case code.OpCode.Call:
-                    n_args = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 1], "big"
-                    )
-                    self.ip += 1
-                    self.execute_call(n_args)
-                case code.OpCode.ReturnValue:
-                    value = self.pop()
-                    f = self.pop_frame()
-                    self.sp = f.bp - 1
-                    self.push(value)
-                case code.OpCode.Return:
-                    f = self.pop_frame()
-                    self.sp = f.bp - 1
-                    self.push(obj.NULL)
-                case code.OpCode.SetLocal:
-                    local_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 1], "big"
-                    )
-                    self.ip += 1
-                    value = self.pop()
-                    self.stack[self.bp + local_idx] = value
-                case code.OpCode.GetLocal:
-                    local_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 1], "big"
-                    )
-                    self.ip += 1
-                    value = self.stack[self.bp + local_idx]
-                    self.push(value)
-                case code.OpCode.GetBuiltIn:
-                    builtin_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 1], "big"
-                    )
-                    self.ip += 1
-                    definition = builtin.BuiltIns[builtin_idx]
-                    self.push(definition.fn)
-                case code.OpCode.Closure:
-                    const_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 2], "big"
-                    )
-                    self.ip += 2
-                    n_free = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 1], "big"
-                    )
-                    self.ip += 1
-                    self.push_closure(const_idx, n_free)
-                case code.OpCode.GetFree:
-                    free_idx = int.from_bytes(
-                        self.instructions[self.ip : self.ip + 1], "big"
-                    )
-                    self.ip += 1
-                    curr_closure = self.curr_frame.cl
-                    self.push(curr_closure.free[free_idx])
+                        result = left.pairs.get(index, obj.NULL)
+                    stack[sp - 1] = result
                 case _:
-                    self._errors.append(new_error(f"unknown opcode: {op}"))
+                    f.ip = ip
+                    self.sp = sp
+                    HANDLERS[ins[0]](self, ins)
+                    if self._errors or self.fp == 0:
+                        break
+                    f = self.curr_frame
+                    insts = f.instructions
+                    ip = f.ip
+                    bp = f.bp
+                    sp = self.sp
+        if self.fp > 0:
+            f.ip = ip
+        self.sp = sp
 
     @property
     def error_str(self):
         return "\n".join([e.message for e in self._errors])
+
+
+Handler = Callable[[VirtualMachine, code.DecodedInstruction], None]
+
+
+def unknown_opcode(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.errors.append(new_error(f"unknown opcode: {ins[0]}"))
+
+
+HANDLERS: list[Handler] = [unknown_opcode] * 256
+
+
+def handler(op: code.OpCode) -> Callable[[Handler], Handler]:
+    def register(fn: Handler) -> Handler:
+        HANDLERS[op.value[0]] = fn
+        return fn
+
+    return register
+
+
+@handler(code.OpCode.PConstant)
+def op_pconstant(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(vm.constants[ins[1]])
+
+
+@handler(code.OpCode.PTrue)
+def op_ptrue(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(obj.TRUE)
+
+
+@handler(code.OpCode.PFalse)
+def op_pfalse(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(obj.FALSE)
+
+
+@handler(code.OpCode.PNull)
+def op_pnull(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(obj.NULL)
+
+
+@handler(code.OpCode.Pop)
+def op_pop(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.pop()
+
+
+@handler(code.OpCode.Add)
+def op_add(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    right = vm.pop()
+    left = vm.pop()
+    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+        vm.push(obj.new_integer(left.value + right.value))
+    elif isinstance(left, obj.String) and isinstance(right, obj.String):
+        vm.push(obj.String(left.value + right.value))
+    else:
+        vm.push(obj.NULL)
+
+
+@handler(code.OpCode.Sub)
+def op_sub(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    right = vm.pop()
+    left = vm.pop()
+    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+        vm.push(obj.new_integer(left.value - right.value))
+    else:
+        vm.errors.append(operator_error("-", left, right))
+
+
+@handler(code.OpCode.Mul)
+def op_mul(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    right = vm.pop()
+    left = vm.pop()
+    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+        vm.push(obj.new_integer(left.value * right.value))
+    else:
+        vm.errors.append(operator_error("*", left, right))
+
+
+@handler(code.OpCode.Div)
+def op_div(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    right = vm.pop()
+    left = vm.pop()
+    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+        if not right.value:
+            vm.errors.append(new_error("division by zero"))
+            return
+        vm.push(obj.new_integer(left.value // right.value))
+    else:
+        vm.errors.append(operator_error("/", left, right))
+
+
+@handler(code.OpCode.Equal)
+def op_equal(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    right = vm.pop()
+    left = vm.pop()
+    if left is right:
+        vm.push(obj.TRUE)
+    elif isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+        vm.push(obj.TRUE if left.value == right.value else obj.FALSE)
+    else:
+        vm.push(obj.TRUE if left == right else obj.FALSE)
+
+
+@handler(code.OpCode.NotEqual)
+def op_not_equal(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    right = vm.pop()
+    left = vm.pop()
+    if left is right:
+        vm.push(obj.FALSE)
+    elif isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+        vm.push(obj.TRUE if left.value != right.value else obj.FALSE)
+    else:
+        vm.push(obj.TRUE if left != right else obj.FALSE)
+
+
+@handler(code.OpCode.GreaterThan)
+def op_greater_than(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    right = vm.pop()
+    left = vm.pop()
+    if isinstance(left, obj.Integer) and isinstance(right, obj.Integer):
+        vm.push(obj.TRUE if left.value > right.value else obj.FALSE)
+    else:
+        vm.errors.append(operator_error(">", left, right))
+
+
+@handler(code.OpCode.Minus)
+def op_minus(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    value = vm.pop()
+    if isinstance(value, obj.Integer):
+        vm.push(obj.new_integer(-value.value))
+    else:
+        vm.errors.append(new_error(f"unknown operator: -{value.otype}"))
+
+
+@handler(code.OpCode.Bang)
+def op_bang(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    value = vm.pop()
+    if hasattr(value, "value"):
+        vm.push(obj.TRUE if not value.value else obj.FALSE)
+    elif value is obj.NULL:
+        vm.push(obj.TRUE)
+    else:
+        vm.push(obj.NULL)
+
+
+@handler(code.OpCode.Jump)
+def op_jump(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.ip = ins[1]
+
+
+@handler(code.OpCode.JumpNT)
+def op_jump_nt(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    condition = vm.pop()
+    if condition is obj.FALSE or condition is obj.NULL:
+        vm.ip = ins[1]
+
+
+@handler(code.OpCode.SetGlobal)
+def op_set_global(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.globals[ins[1]] = vm.pop()
+
+
+@handler(code.OpCode.GetGlobal)
+def op_get_global(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(vm.globals[ins[1]])
+
+
+@handler(code.OpCode.PArray)
+def op_parray(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(obj.Array(vm.pop_array(ins[1])))
+
+
+@handler(code.OpCode.PHash)
+def op_phash(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(obj.Hash(vm.pop_hash(ins[1])))
+
+
+@handler(code.OpCode.Index)
+def op_index(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    index = vm.pop()
+    left = vm.pop()
+    if isinstance(left, obj.Array) and isinstance(index, obj.Integer):
+        idx = index.value
+        arr = left.elements
+        if (idx < -len(arr)) or (idx >= len(arr)):
+            vm.push(obj.NULL)
+        else:
+            vm.push(arr[idx % len(arr)])
+    elif isinstance(left, obj.Hash):
+        vm.push(left.pairs.get(index, obj.NULL))
+    else:
+        vm.push(obj.NULL)
+
+
+@handler(code.OpCode.Call)
+def op_call(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.execute_call(ins[1])
+
+
+@handler(code.OpCode.TailCall)
+def op_tail_call(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.execute_tail_call(ins[1])
+
+
+@handler(code.OpCode.ReturnValue)
+def op_return_value(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    value = vm.pop()
+    f = vm.pop_frame()
+    vm.sp = f.bp - 1
+    vm.push(value)
+
+
+@handler(code.OpCode.Return)
+def op_return(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    f = vm.pop_frame()
+    vm.sp = f.bp - 1
+    vm.push(obj.NULL)
+
+
+@handler(code.OpCode.SetLocal)
+def op_set_local(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.stack[vm.bp + ins[1]] = vm.pop()
+
+
+@handler(code.OpCode.GetLocal)
+def op_get_local(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(vm.stack[vm.bp + ins[1]])
+
+
+@handler(code.OpCode.GetBuiltIn)
+def op_get_builtin(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(builtin.BuiltIns[ins[1]].fn)
+
+
+@handler(code.OpCode.Closure)
+def op_closure(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push_closure(ins[1], ins[2])
+
+
+@handler(code.OpCode.GetFree)
+def op_get_free(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(vm.curr_frame.cl.free[ins[1]])
+
+
+@handler(code.OpCode.CurrentClosure)
+def op_current_closure(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(vm.curr_frame.cl)
+
+
+@handler(code.OpCode.GetLocalGetLocal)
+def op_get_local_get_local(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    vm.push(vm.stack[vm.bp + ins[1]])
+    vm.push(vm.stack[vm.bp + ins[2]])
+
+
+@handler(code.OpCode.PConstantAdd)
+def op_pconstant_add(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    op_pconstant(vm, ins)
+    op_add(vm, ins)
+
+
+@handler(code.OpCode.PConstantSub)
+def op_pconstant_sub(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    op_pconstant(vm, ins)
+    op_sub(vm, ins)
+
+
+@handler(code.OpCode.GetLocalPConstantEqual)
+def op_get_local_pconstant_equal(
+    vm: VirtualMachine, ins: code.DecodedInstruction
+) -> None:
+    op_get_local(vm, ins)
+    vm.push(vm.constants[ins[2]])
+    op_equal(vm, ins)
+
+
+@handler(code.OpCode.EqualJumpNT)
+def op_equal_jump_nt(vm: VirtualMachine, ins: code.DecodedInstruction) -> None:
+    op_equal(vm, ins)
+    op_jump_nt(vm, ins)
@@ -12,6 +12,25 @@ def main():
         default="interp",
         help="Run interpreter 'interp', or virtual machine 'vm'",
     )
+    aparser.add_argument(
+        "-d",
+        "--dispatch",
+        choices=vm.DISPATCH_MODES,
+        default="match",
+        help="VM dispatch loop to benchmark",
+    )
+    aparser.add_argument(
+        "-s",
+        "--superinstructions",
+        action="store_true",
+        help="Compile with fused superinstructions",
+    )
+    aparser.add_argument(
+        "-O",
+        "--optimize",
+        action="store_true",
+        help="Compile with dead-code elimination and jump threading",
+    )
     args = aparser.parse_args()
 
     script = """
@@ -36,12 +55,14 @@ def main():
     program = par.parse_program()
 
     if engine == "vm":
-        comp = compiler.Compiler()
+        comp = compiler.Compiler(
+            superinstructions=args.superinstructions, optimize=args.optimize
+        )
         comp.compile(program)
         if len(comp.errors):
             print("Failed to Compile! " + comp.error_str)
             return
-        machine = vm.VirtualMachine(comp.bytecode)
+        machine = vm.VirtualMachine(comp.bytecode, dispatch=args.dispatch)
         start = time.perf_counter()
         machine.run()
         end = time.perf_counter()
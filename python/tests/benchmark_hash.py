@@ -0,0 +1,64 @@
+import argparse
+import time
+
+from src.monkey import obj
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    aparser = argparse.ArgumentParser()
+    aparser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=100_000,
+        help="Number of keys in the map",
+    )
+    aparser.add_argument(
+        "-u",
+        "--updates",
+        type=int,
+        default=1_000,
+        help="Number of single-key updates, each producing a new map version",
+    )
+    args = aparser.parse_args()
+    keys = [obj.String(f"key{i}") for i in range(args.count)]
+    values = [obj.Integer(i) for i in range(args.count)]
+    pairs = list(zip(keys, values))
+
+    pmap, build_pmap = timed(lambda: obj.PMap.from_pairs(pairs))
+    pdict, build_dict = timed(lambda: dict(pairs))
+
+    def update_pmap():
+        m = pmap
+        for k in keys[: args.updates]:
+            m = m.assoc(k, obj.NULL)
+        return m
+
+    def update_dict():
+        # Immutable semantics with a dict means copying it for every update.
+        d = pdict
+        for k in keys[: args.updates]:
+            d = d.copy()
+            d[k] = obj.NULL
+        return d
+
+    _, update_pmap_s = timed(update_pmap)
+    _, update_dict_s = timed(update_dict)
+    _, lookup_pmap = timed(lambda: [pmap[k] for k in keys])
+    _, lookup_dict = timed(lambda: [pdict[k] for k in keys])
+
+    print(f"keys = {args.count}, updates = {args.updates}")
+    print(f"{build_pmap = :.3f}s {build_dict = :.3f}s")
+    print(f"{update_pmap_s = :.3f}s {update_dict_s = :.3f}s")
+    print(f"{lookup_pmap = :.3f}s {lookup_dict = :.3f}s")
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+from src.monkey import lexer, token
+
+CHUNK = """
+let fibonacci = fn(x) {
+    if (x == 0) { return 0; }
+    if (x == 1) { return 1; } else { fibonacci(x - 1) + fibonacci(x - 2); }
+};
+let table = {"name": "monkey", "tags": ["fast", "small"], "count": 12345};
+let result = map([1, 2, 3, 4], fn(n) { n * n != table["count"] });
+"""
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    aparser = argparse.ArgumentParser()
+    aparser.add_argument(
+        "-s",
+        "--size",
+        type=float,
+        default=2.0,
+        help="Size of the generated source in MB",
+    )
+    aparser.add_argument(
+        "-e",
+        "--engine",
+        choices=lexer.ENGINES,
+        action="append",
+        help="Lexer engine to benchmark (default: all)",
+    )
+    args = aparser.parse_args()
+    source = CHUNK * max(1, int(args.size * 1_000_000 / len(CHUNK)))
+    mb = len(source.encode()) / 1_000_000
+
+    def lex_all(engine):
+        lex = lexer.new_lexer(source, engine)
+        n_tokens = 0
+        while lex.next_token().token_type != token.EOF:
+            n_tokens += 1
+        return n_tokens
+
+    print(f"source = {mb:.2f} MB")
+    for engine in args.engine or lexer.ENGINES:
+        n_tokens, duration = timed(lambda: lex_all(engine))
+        print(f"{engine}: {n_tokens} tokens, {mb / duration:.2f} MB/s")
+    tokens, duration = timed(lambda: lexer.tokenize_all(source))
+    n_bytes = sum(
+        len(a) * a.itemsize for a in (tokens.types, tokens.starts, tokens.lengths)
+    )
+    print(
+        f"tokenize_all: {mb / duration:.2f} MB/s, {n_bytes / len(tokens):.0f} B/token"
+    )
+
+    def lex_stream(f):
+        lex = lexer.StreamLexer(f)
+        while lex.next_token().token_type != token.EOF:
+            pass
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as f:
+        f.write(source)
+        f.seek(0)
+        _, duration = timed(lambda: lex_stream(f))
+        # Measured on a second pass, as tracing slows the lexer down.
+        f.seek(0)
+        tracemalloc.start()
+        lex_stream(f)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"stream: {mb / duration:.2f} MB/s, peak {peak / 1_000_000:.2f} MB")
+    return
+
+
+if __name__ == "__main__":
+    main()
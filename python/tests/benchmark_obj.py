@@ -0,0 +1,47 @@
+import argparse
+import time
+import tracemalloc
+
+from src.monkey import obj
+
+
+def main():
+    aparser = argparse.ArgumentParser()
+    aparser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=1_000_000,
+        help="Number of objects to allocate",
+    )
+    args = aparser.parse_args()
+    n = args.count
+    # Start past the small-int cache so every value is a fresh allocation.
+    offset = obj.SMALL_INT_HIGH + 1
+
+    start = time.perf_counter()
+    ints = [obj.Integer(i) for i in range(offset, offset + n)]
+    duration = time.perf_counter() - start
+    allocs_per_sec = n / duration
+    del ints
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    ints = [obj.Integer(i) for i in range(offset, offset + n)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    array = obj.Array(ints)
+    # Subtract the list holding the objects and the int values themselves.
+    list_bytes = ints.__sizeof__()
+    value_bytes = sum(i.value.__sizeof__() for i in ints)
+    bytes_per_object = (current - baseline - list_bytes - value_bytes) / n
+
+    print(f"{n = }")
+    print(f"{len(array.elements) = }")
+    print(f"{allocs_per_sec = :.0f}")
+    print(f"{bytes_per_object = :.1f}")
+    return
+
+
+if __name__ == "__main__":
+    main()
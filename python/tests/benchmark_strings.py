@@ -0,0 +1,73 @@
+import argparse
+import json
+import time
+
+from src.monkey import lexer, token
+
+# An API response embedded as a string: escaped quotes throughout.
+RECORD = {
+    "id": 1234,
+    "name": "Zoë Smith",
+    "email": "zoe@example.com",
+    "tags": ["admin", "beta", "café"],
+    "bio": "Writes about compilers.\nLikes long walks.",
+    "active": True,
+}
+JSON_DOC = json.dumps([RECORD] * 20, ensure_ascii=False).replace('"', '\\"')
+
+# A page template: long runs of text without a single escape.
+TEMPLATE = (
+    "<html><head><title>{{ title }}</title></head><body>"
+    + "<p class='entry'>{{ name }} — {{ summary }} · ünïcödé ✓</p>" * 40
+    + "</body></html>"
+)
+
+CORPORA = {
+    "json": f'let doc = "{JSON_DOC}";\n',
+    "template": f'let page = "{TEMPLATE}";\n',
+}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    aparser = argparse.ArgumentParser()
+    aparser.add_argument(
+        "-s",
+        "--size",
+        type=float,
+        default=2.0,
+        help="Size of each generated source in MB",
+    )
+    aparser.add_argument(
+        "-e",
+        "--engine",
+        choices=lexer.ENGINES,
+        action="append",
+        help="Lexer engine to benchmark (default: all)",
+    )
+    args = aparser.parse_args()
+
+    def lex_all(source, engine):
+        lex = lexer.new_lexer(source, engine)
+        n_strings = 0
+        while (tok := lex.next_token()).token_type != token.EOF:
+            n_strings += tok.token_type == token.STRING
+        return n_strings
+
+    for name, chunk in CORPORA.items():
+        source = chunk * max(1, int(args.size * 1_000_000 / len(chunk.encode())))
+        mb = len(source.encode()) / 1_000_000
+        print(f"{name}: source = {mb:.2f} MB")
+        for engine in args.engine or lexer.ENGINES:
+            n_strings, duration = timed(lambda: lex_all(source, engine))
+            print(f"  {engine}: {n_strings} strings, {mb / duration:.2f} MB/s")
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import time
+
+from src.monkey import compiler, lexer, parser, vm
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    aparser = argparse.ArgumentParser()
+    aparser.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=100_000,
+        help="Number of programs to run",
+    )
+    aparser.add_argument(
+        "-d",
+        "--dispatch",
+        choices=vm.DISPATCH_MODES,
+        default="match",
+        help="VM dispatch loop to benchmark",
+    )
+    aparser.add_argument(
+        "source",
+        nargs="?",
+        default="1 + 1",
+        help="Program to run",
+    )
+    args = aparser.parse_args()
+    comp = compiler.Compiler()
+    comp.compile(parser.Parser(lexer.Lexer(args.source)).parse_program())
+    bytecode = comp.bytecode
+
+    def construct_and_run():
+        for _ in range(args.count):
+            machine = vm.VirtualMachine(bytecode, dispatch=args.dispatch)
+            machine.run()
+        return machine.last_popped
+
+    def reset_and_run():
+        machine = vm.VirtualMachine(bytecode, dispatch=args.dispatch)
+        for _ in range(args.count):
+            machine.reset(bytecode)
+            machine.run()
+        return machine.last_popped
+
+    result, construct = timed(construct_and_run)
+    _, reset = timed(reset_and_run)
+    construct_runs_per_sec = args.count / construct
+    reset_runs_per_sec = args.count / reset
+
+    print(f"source = {args.source!r}")
+    print(f"result = {result.inspect}")
+    print(f"{construct_runs_per_sec = :.0f}")
+    print(f"{reset_runs_per_sec = :.0f}")
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -55,3 +55,22 @@ class TestOpCode(TestCase):
 000e Closure 65535 255"""
         received = code.instructions_to_string(instructions)
         self.assertEqual(received, expected)
+
+    def test_code_decode(self):
+        instructions = (
+            code.make(code.OpCode.PTrue)
+            + code.make(code.OpCode.JumpNT, 10)
+            + code.make(code.OpCode.PConstant, 65535)
+            + code.make(code.OpCode.Jump, 11)
+            + code.make(code.OpCode.PNull)
+            + code.make(code.OpCode.Closure, 2, 1)
+        )
+        expected = [
+            (code.Op.PTrue,),
+            (code.Op.JumpNT, 4),
+            (code.Op.PConstant, 65535),
+            (code.Op.Jump, 5),
+            (code.Op.PNull,),
+            (code.Op.Closure, 2, 1),
+        ]
+        self.assertEqual(code.decode(instructions), expected)
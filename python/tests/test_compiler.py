@@ -1,6 +1,6 @@
 from unittest import TestCase
 
-from src.monkey import ast, code, compiler, lexer, obj, parser
+from src.monkey import ast, code, compiler, lexer, obj, parser, symbols
 
 
 def parse(src_code: str) -> ast.Program:
@@ -10,12 +10,13 @@ def parse(src_code: str) -> ast.Program:
 
 
 class TestCompiler(TestCase):
-    def verify_compiler(self, test_code, expected_const, insts):
+    def verify_compiler(self, test_code, expected_const, insts, comp=None):
         expected_insts = b""
         for inst in insts:
             expected_insts += inst
         program = parse(test_code)
-        comp = compiler.Compiler()
+        if comp is None:
+            comp = compiler.Compiler()
         comp.compile(program)
         bytecode = comp.bytecode
         err_msg = (
@@ -369,8 +370,8 @@ class TestCompiler(TestCase):
             "{1: 2}[2 - 1]",
         ]
         expected_const_list = [
-            [1, 2, 3, 1, 1],
-            [1, 2, 2, 1],
+            [1, 2, 3],
+            [1, 2],
         ]
         insts_list = [
             [
@@ -378,8 +379,8 @@ class TestCompiler(TestCase):
                 code.make(code.OpCode.PConstant, 1),
                 code.make(code.OpCode.PConstant, 2),
                 code.make(code.OpCode.PArray, 3),
-                code.make(code.OpCode.PConstant, 3),
-                code.make(code.OpCode.PConstant, 4),
+                code.make(code.OpCode.PConstant, 0),
+                code.make(code.OpCode.PConstant, 0),
                 code.make(code.OpCode.Add),
                 code.make(code.OpCode.Index),
                 code.make(code.OpCode.Pop),
@@ -388,8 +389,8 @@ class TestCompiler(TestCase):
                 code.make(code.OpCode.PConstant, 0),
                 code.make(code.OpCode.PConstant, 1),
                 code.make(code.OpCode.PHash, 2),
-                code.make(code.OpCode.PConstant, 2),
-                code.make(code.OpCode.PConstant, 3),
+                code.make(code.OpCode.PConstant, 1),
+                code.make(code.OpCode.PConstant, 0),
                 code.make(code.OpCode.Sub),
                 code.make(code.OpCode.Index),
                 code.make(code.OpCode.Pop),
@@ -606,7 +607,7 @@ class TestCompiler(TestCase):
             [
                 code.make(code.OpCode.GetBuiltIn, 0)
                 + code.make(code.OpCode.PArray, 0)
-                + code.make(code.OpCode.Call, 1)
+                + code.make(code.OpCode.TailCall, 1)
                 + code.make(code.OpCode.ReturnValue),
             ],
         ]
@@ -632,6 +633,89 @@ class TestCompiler(TestCase):
         ):
             self.verify_compiler(test_code, expected_const, insts)
 
+    def test_compiler_tail_calls(self):
+        test_code_list = [
+            "fn(f) { return f(1); }",
+            "fn(f) { if (f) { f(1) } else { 2 } }",
+            "fn(f) { f(1) + 1 }",
+            "fn(f) { let x = f(1); x }",
+        ]
+        expected_const_list = [
+            [
+                1,
+                code.make(code.OpCode.GetLocal, 0)
+                + code.make(code.OpCode.PConstant, 0)
+                + code.make(code.OpCode.TailCall, 1)
+                + code.make(code.OpCode.ReturnValue),
+            ],
+            [
+                1,
+                2,
+                # The call jumps to the shared ReturnValue, so it is in tail
+                # position too.
+                code.make(code.OpCode.GetLocal, 0)
+                + code.make(code.OpCode.JumpNT, 15)
+                + code.make(code.OpCode.GetLocal, 0)
+                + code.make(code.OpCode.PConstant, 0)
+                + code.make(code.OpCode.TailCall, 1)
+                + code.make(code.OpCode.Jump, 18)
+                + code.make(code.OpCode.PConstant, 1)
+                + code.make(code.OpCode.ReturnValue),
+            ],
+            [
+                1,
+                code.make(code.OpCode.GetLocal, 0)
+                + code.make(code.OpCode.PConstant, 0)
+                + code.make(code.OpCode.Call, 1)
+                + code.make(code.OpCode.PConstant, 0)
+                + code.make(code.OpCode.Add)
+                + code.make(code.OpCode.ReturnValue),
+            ],
+            [
+                1,
+                code.make(code.OpCode.GetLocal, 0)
+                + code.make(code.OpCode.PConstant, 0)
+                + code.make(code.OpCode.Call, 1)
+                + code.make(code.OpCode.SetLocal, 1)
+                + code.make(code.OpCode.GetLocal, 1)
+                + code.make(code.OpCode.ReturnValue),
+            ],
+        ]
+        for test_code, expected_const in zip(test_code_list, expected_const_list):
+            insts = [
+                code.make(code.OpCode.Closure, len(expected_const) - 1, 0),
+                code.make(code.OpCode.Pop),
+            ]
+            self.verify_compiler(test_code, expected_const, insts)
+
+    def test_compiler_recursive_local_closures(self):
+        test_code = """
+        let wrapper = fn() {
+            let countDown = fn(x) { countDown(x - 1); };
+            countDown(1);
+        };
+        """
+        expected_const = [
+            1,
+            code.make(code.OpCode.CurrentClosure)
+            + code.make(code.OpCode.GetLocal, 0)
+            + code.make(code.OpCode.PConstant, 0)
+            + code.make(code.OpCode.Sub)
+            + code.make(code.OpCode.TailCall, 1)
+            + code.make(code.OpCode.ReturnValue),
+            code.make(code.OpCode.Closure, 1, 0)
+            + code.make(code.OpCode.SetLocal, 0)
+            + code.make(code.OpCode.GetLocal, 0)
+            + code.make(code.OpCode.PConstant, 0)
+            + code.make(code.OpCode.TailCall, 1)
+            + code.make(code.OpCode.ReturnValue),
+        ]
+        insts = [
+            code.make(code.OpCode.Closure, 2, 0),
+            code.make(code.OpCode.SetGlobal, 0),
+        ]
+        self.verify_compiler(test_code, expected_const, insts)
+
     def test_compiler_closures(self):
         test_code_list = [
             """
@@ -740,6 +824,180 @@ class TestCompiler(TestCase):
         ):
             self.verify_compiler(test_code, expected_const, insts)
 
+    def test_compiler_line_table(self):
+        comp = compiler.Compiler()
+        comp.compile(parse("1;\n  2 + 3"))
+        # PConstant, Pop | PConstant | PConstant | Add | Pop
+        self.assertEqual(list(comp.bytecode.lines), [0, 0, 4, 5, 7, 9, 10, 7, 11, 5])
+
+        # Instructions removed by the optimizer drop out of the table.
+        comp = compiler.Compiler(optimize=True, superinstructions=True)
+        comp.compile(parse("if (true) { 10 } else { 20 };\n30"))
+        bytecode = comp.bytecode
+        self.assertEqual(list(bytecode.lines), [0, 12, 3, 0, 4, 30])
+        self.assertEqual(code.line_offset(bytecode.lines, 3), 0)
+        self.assertEqual(code.line_offset(bytecode.lines, 5), 30)
+
+        comp = compiler.Compiler()
+        comp.compile(parse("let f = fn(x) {\n  x + y\n};"))
+        self.assertEqual(comp.errors[0].offset, 22)
+
+    def test_compiler_constant_interning(self):
+        # Identical functions at different places keep their own line tables.
+        test_code = '1 + 1; "a" + "a"; fn() { 1 }; fn() { 1 };'
+        fn_insts = code.make(code.OpCode.PConstant, 0) + code.make(
+            code.OpCode.ReturnValue
+        )
+        expected_const = [1, "a", fn_insts, fn_insts]
+        insts = [
+            code.make(code.OpCode.PConstant, 0),
+            code.make(code.OpCode.PConstant, 0),
+            code.make(code.OpCode.Add),
+            code.make(code.OpCode.Pop),
+            code.make(code.OpCode.PConstant, 1),
+            code.make(code.OpCode.PConstant, 1),
+            code.make(code.OpCode.Add),
+            code.make(code.OpCode.Pop),
+            code.make(code.OpCode.Closure, 2, 0),
+            code.make(code.OpCode.Pop),
+            code.make(code.OpCode.Closure, 3, 0),
+            code.make(code.OpCode.Pop),
+        ]
+        self.verify_compiler(test_code, expected_const, insts)
+
+        # A pool shared across compilers, as in the REPL, stops growing, even
+        # with functions in it.
+        constants: list[obj.Object] = []
+        table = symbols.Table()
+        for _ in range(3):
+            comp = compiler.Compiler(constants, table)
+            comp.compile(parse('let x = 5; "five" + x; let f = fn(a) { a + 5 };'))
+        self.assertEqual(len(constants), 3)
+        self.assertEqual(constants[:2], [obj.Integer(5), obj.String("five")])
+
+    def test_compiler_optimize(self):
+        test_code_list = [
+            "if (true) { 10 }; 3333;",
+            "if (false) { 10 } else { 20 }; 3333;",
+            "fn() { return 1; 2 }",
+            "fn(x) { if (x) { 1 } else { if (x) { 2 } else { 3 } } }",
+        ]
+        expected_const_list = [
+            [10, 3333],
+            [10, 20, 3333],
+            [
+                1,
+                2,
+                code.make(code.OpCode.PConstant, 0)
+                + code.make(code.OpCode.ReturnValue),
+            ],
+            [
+                1,
+                2,
+                3,
+                # The inner if's exit jump is threaded to the outer one's.
+                code.make(code.OpCode.GetLocal, 0)
+                + code.make(code.OpCode.JumpNT, 11)
+                + code.make(code.OpCode.PConstant, 0)
+                + code.make(code.OpCode.Jump, 25)
+                + code.make(code.OpCode.GetLocal, 0)
+                + code.make(code.OpCode.JumpNT, 22)
+                + code.make(code.OpCode.PConstant, 1)
+                + code.make(code.OpCode.Jump, 25)
+                + code.make(code.OpCode.PConstant, 2)
+                + code.make(code.OpCode.ReturnValue),
+            ],
+        ]
+        insts_list = [
+            [
+                code.make(code.OpCode.PConstant, 0),
+                code.make(code.OpCode.Pop),
+                code.make(code.OpCode.PConstant, 1),
+                code.make(code.OpCode.Pop),
+            ],
+            [
+                code.make(code.OpCode.PConstant, 1),
+                code.make(code.OpCode.Pop),
+                code.make(code.OpCode.PConstant, 2),
+                code.make(code.OpCode.Pop),
+            ],
+            [
+                code.make(code.OpCode.Closure, 2, 0),
+                code.make(code.OpCode.Pop),
+            ],
+            [
+                code.make(code.OpCode.Closure, 3, 0),
+                code.make(code.OpCode.Pop),
+            ],
+        ]
+        for test_code, expected_const, insts in zip(
+            test_code_list, expected_const_list, insts_list
+        ):
+            comp = compiler.Compiler(optimize=True)
+            self.verify_compiler(test_code, expected_const, insts, comp)
+
+    def test_compiler_superinstructions(self):
+        test_code_list = [
+            "fn(a, b) { a + b }",
+            "fn(a) { a - 1 }",
+            "fn(a) { if (a == 0) { 1 } else { a + 2 } }",
+            "if (1 == 2) { 3 }",
+        ]
+        expected_const_list = [
+            [
+                code.make(code.OpCode.GetLocalGetLocal, 0, 1)
+                + code.make(code.OpCode.Add)
+                + code.make(code.OpCode.ReturnValue),
+            ],
+            [
+                1,
+                code.make(code.OpCode.GetLocal, 0)
+                + code.make(code.OpCode.PConstantSub, 0)
+                + code.make(code.OpCode.ReturnValue),
+            ],
+            [
+                0,
+                1,
+                2,
+                code.make(code.OpCode.GetLocalPConstantEqual, 0, 0)
+                + code.make(code.OpCode.JumpNT, 13)
+                + code.make(code.OpCode.PConstant, 1)
+                + code.make(code.OpCode.Jump, 18)
+                + code.make(code.OpCode.GetLocal, 0)
+                + code.make(code.OpCode.PConstantAdd, 2)
+                + code.make(code.OpCode.ReturnValue),
+            ],
+            [1, 2, 3],
+        ]
+        insts_list = [
+            [
+                code.make(code.OpCode.Closure, 0, 0),
+                code.make(code.OpCode.Pop),
+            ],
+            [
+                code.make(code.OpCode.Closure, 1, 0),
+                code.make(code.OpCode.Pop),
+            ],
+            [
+                code.make(code.OpCode.Closure, 3, 0),
+                code.make(code.OpCode.Pop),
+            ],
+            [
+                code.make(code.OpCode.PConstant, 0),
+                code.make(code.OpCode.PConstant, 1),
+                code.make(code.OpCode.EqualJumpNT, 15),
+                code.make(code.OpCode.PConstant, 2),
+                code.make(code.OpCode.Jump, 16),
+                code.make(code.OpCode.PNull),
+                code.make(code.OpCode.Pop),
+            ],
+        ]
+        for test_code, expected_const, insts in zip(
+            test_code_list, expected_const_list, insts_list
+        ):
+            comp = compiler.Compiler(superinstructions=True)
+            self.verify_compiler(test_code, expected_const, insts, comp)
+
     # def test_compiler_template(self):
     #     test_code_list = []
     #     expected_const_list = []
@@ -1,9 +1,12 @@
 from unittest import main, TestCase
-from src.monkey import lexer, parser, obj, eval, env
+from src.monkey import lexer, parser, obj, eval, env, fold
 
 
 class TestEval(TestCase):
 
+    def transform(self, program):
+        return program
+
     def verify_eval(self, code: str) -> obj.Object:
         e = env.Environment()
         lex = lexer.Lexer(code)
@@ -11,7 +14,7 @@ class TestEval(TestCase):
         program = par.parse_program()
         self.assertIsNotNone(program)
         self.assertEqual(len(par.errors), 0, par.error_str)
-        return eval.eval(program, e)
+        return eval.eval(self.transform(program), e)
 
     def verify_integer_obj(self, o: obj.Integer, expect: int):
         self.assertIsInstance(o, obj.Integer)
@@ -177,6 +180,49 @@ class TestEval(TestCase):
             ("let add = fn(x,y) { x + y; }; add(5,5);", 10),
             ("let add = fn(x,y) { x + y; }; add(5 + 5, add(5, 5));", 20),
             ("fn(x) { x; }(5);", 5),
+            ("let five = fn() { 5; }; five();", 5),
+        )
+        for code, expect in cases:
+            self.verify_integer_obj(self.verify_eval(code), expect)
+
+    def test_eval_tail_calls(self):
+        # Deeper than Python's recursion limit allows without trampolining.
+        depth = 5_000
+        cases = (
+            (
+                f"""
+                let countDown = fn(x) {{ if (x == 0) {{ 0 }} else {{ countDown(x - 1) }} }};
+                countDown({depth});
+                """,
+                0,
+            ),
+            (
+                f"""
+                let sum = fn(n, acc) {{
+                    if (n == 0) {{ return acc; }}
+                    let next = n - 1;
+                    return sum(next, acc + n);
+                }};
+                sum({depth}, 0);
+                """,
+                depth * (depth + 1) // 2,
+            ),
+            (
+                f"""
+                let map = fn(arr, f) {{
+                    let iter = fn(arr, accum) {{
+                        if (len(arr) == 0) {{ return accum; }}
+                        else {{ return iter(rest(arr), push(accum, f(first(arr)))); }}
+                    }};
+                    iter(arr, []);
+                }};
+                let build = fn(n, acc) {{ if (n == 0) {{ acc }} else {{ build(n - 1, push(acc, n)) }} }};
+                len(map(build({depth}, []), fn(x) {{ x * 2 }}));
+                """,
+                depth,
+            ),
+            ("let f = fn(x) { if (x) { return 1; }; 2 }; f(true) + f(false);", 3),
+            ("let g = fn() { 5 }; let f = fn() { g() + 1 }; f();", 6),
         )
         for code, expect in cases:
             self.verify_integer_obj(self.verify_eval(code), expect)
@@ -327,3 +373,8 @@ class TestEval(TestCase):
                 self.verify_integer_obj(o, expect)
             else:
                 self.verify_null_obj(o)
+
+
+class TestEvalFolded(TestEval):
+    def transform(self, program):
+        return fold.fold(program)
@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+from src.monkey import ast, compiler, env, eval, fold, lexer, parser, vm
+
+
+def parse(src_code: str) -> ast.Program:
+    lex = lexer.Lexer(src_code)
+    par = parser.Parser(lex)
+    return par.parse_program()
+
+
+class TestFold(TestCase):
+    def test_fold_expressions(self):
+        tests = [
+            ("1 + 2 * 3", "7"),
+            ("10 / 3", "3"),
+            ("-7 / 2", "-4"),
+            ("10 / 0", "(10 / 0)"),
+            ("-5", "-5"),
+            ("--5", "5"),
+            ("!true", "false"),
+            ("!!false", "false"),
+            ("!5", "(!5)"),
+            ("1 < 2", "true"),
+            ("1 > 2 == false", "true"),
+            ("true != false", "true"),
+            ('"a" + "b"', "ab"),
+            ('"a" == "a"', "(a == a)"),
+            ('1 + "a"', "(1 + a)"),
+            ("x * 1", "(x * 1)"),
+            ("x + 0", "(x + 0)"),
+            ("(x - y) * 1", "(x - y)"),
+            ("0 + -x", "(-x)"),
+            ("1 * (x / y) - 0", "(x / y)"),
+            ("let f = fn(x) { return x * (2 + 2); };", "let f = fn(x)return (x * 4);;"),
+            (
+                "if (1 < 2) { 3 - 1 } else { [1 + 1, {2 * 2: 4}] }",
+                "iftrue 2else [2, {4: 4}]",
+            ),
+            ("f(1 + 1)[2 * 0]", "(f(2)[0])"),
+        ]
+        for src_code, expected in tests:
+            self.assertEqual(fold.fold(parse(src_code)).string, expected, src_code)
+
+    def test_fold_compiles_to_single_constant(self):
+        comp = compiler.Compiler()
+        comp.compile(fold.fold(parse('(1 + 2) * 3; "a" + "b" + "c";')))
+        self.assertEqual([c.inspect for c in comp.bytecode.constants], ["9", "abc"])
+
+    def test_fold_preserves_results(self):
+        tests = [
+            "let x = 7; (x - 2) * 1 + 0",
+            "let f = fn(a) { a * 1 }; f(6) / 1",
+            "if (!(2 > 3)) { -(4 - 9) } else { 0 }",
+            '"mon" + "key" + ""',
+            "[1 + 1, 2 * 3][0 + 1]",
+        ]
+        for src_code in tests:
+            program = parse(src_code)
+            folded = fold.fold(program)
+            want = eval.eval(program, env.Environment())
+            got = eval.eval(folded, env.Environment())
+            self.assertEqual(got, want, src_code)
+
+            comp = compiler.Compiler()
+            comp.compile(folded)
+            machine = vm.VirtualMachine(comp.bytecode)
+            machine.run()
+            self.assertEqual(machine.last_popped, want, src_code)
@@ -1,7 +1,10 @@
+import io
+import mmap
+import tempfile
 from unittest import TestCase, main
 from src.monkey import lexer, token
 
-example_script = r'''
+example_script = r"""
 let five = 5;
 let ten = 10;
 
@@ -31,13 +34,18 @@ else {
 [1, 2];
 [];
 { "hello" : 5 };
-'''
+"""
 
 
 class TestToken(TestCase):
+    engine = "char"
+
+    def new_lexer(self, input):
+        return lexer.new_lexer(input, self.engine)
+
     def test_lexer_next_token_single_chars(self):
         input = "=+(){},;"
-        lex = lexer.Lexer(input)
+        lex = self.new_lexer(input)
         expected = [
             (token.ASSIGN, "="),
             (token.PLUS, "+"),
@@ -56,7 +64,7 @@ class TestToken(TestCase):
 
     def test_lexer_next_token_example_script(self):
         input = example_script
-        lex = lexer.Lexer(input)
+        lex = self.new_lexer(input)
         expected = [
             (token.LET, "let"),
             (token.IDENT, "five"),
@@ -134,7 +142,7 @@ class TestToken(TestCase):
             (token.STRING, "foobar"),
             (token.STRING, "foo bar"),
             (token.STRING, "foo\\bar"),
-            (token.STRING, "foo\"bar"),
+            (token.STRING, 'foo"bar'),
             (token.STRING, "hello\n world"),
             (token.LBRACKET, "["),
             (token.INT, "1"),
@@ -158,6 +166,134 @@ class TestToken(TestCase):
             self.assertEqual(t.token_type, token_type)
             self.assertEqual(t.literal, literal)
 
+    def test_lexer_engines_agree(self):
+        tests = [
+            "a1b2",
+            "x²y",
+            "²",
+            "café = über;",
+            "a\u2003b",
+            "1 @ 2 # 3",
+            'let s = "abc',
+            '"a\0b" c',
+            '"\\x4\\"" x',
+            "a\0b",
+            "",
+        ]
+        for input in tests:
+            expected = lexer.Lexer(input)
+            lex = self.new_lexer(input)
+            for _ in range(len(input) + 2):
+                self.assertEqual(lex.next_token(), expected.next_token(), input)
+
+    def test_lexer_string_escapes(self):
+        tests = [
+            ('"café ✓"', "café ✓"),
+            ('"a\\tb\\\\c\\"d"', 'a\tb\\c"d'),
+            ('"\\x41\\u00e9\\U0001F600\\101\\0"', "Aé😀A\0"),
+            ('"\\N{BULLET} é"', "• é"),
+            ('"\\q \\x4 \\U00110000 \\N{nope}"', "\\q \\x4 \\U00110000 \\N{nope}"),
+            ('"line\\\ncontinued"', "linecontinued"),
+            ('"trailing\\', "trailing\\"),
+        ]
+        for input, expected in tests:
+            tok = self.new_lexer(input).next_token()
+            self.assertEqual(tok, token.Token(token.STRING, expected), input)
+
+    def test_lexer_offsets(self):
+        input = 'let x = "a b";\n  x²\t== 10'
+        expected = [0, 4, 6, 8, 13, 17, 18, 20, 23, 25, 25]
+        lex = self.new_lexer(input)
+        for offset in expected:
+            lex.next_token()
+            self.assertEqual(lex.offset, offset)
+
+    def test_lexer_line_index(self):
+        index = lexer.LineIndex("ab\n\ncd\n")
+        tests = [(0, (1, 1)), (1, (1, 2)), (3, (2, 1)), (5, (3, 2)), (7, (4, 1))]
+        for offset, location in tests:
+            self.assertEqual(index.location(offset), location)
+        self.assertEqual(index.describe(5), "line 3, column 2")
+
+    def test_lexer_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            lexer.new_lexer("", "jit")
+
+    def test_lexer_tokenize_all(self):
+        input = 'let s = "a\\"b";\n  x == 10'
+        tokens = lexer.tokenize_all(input)
+        expected = [
+            (token.LET, 0, "let"),
+            (token.IDENT, 4, "s"),
+            (token.ASSIGN, 6, "="),
+            (token.STRING, 9, 'a"b'),
+            (token.SEMICOLON, 14, ";"),
+            (token.IDENT, 18, "x"),
+            (token.EQ, 20, "=="),
+            (token.INT, 23, "10"),
+            (token.EOF, 25, ""),
+        ]
+        self.assertEqual(len(tokens), len(expected))
+        for i, (token_type, start, literal) in enumerate(expected):
+            self.assertEqual(tokens.token_type(i), token_type)
+            self.assertEqual(token.TOKEN_TYPES[tokens.types[i]], token_type)
+            self.assertEqual(tokens.starts[i], start)
+            self.assertEqual(tokens.literal(i), literal)
+            self.assertEqual(tokens.token(i), token.Token(token_type, literal))
+        self.assertEqual(tokens.lengths[3], 4)  # the raw body, a\"b
+
+
+class TestTokenRegex(TestToken):
+    engine = "regex"
+
+
+class TestTokenArrays(TestToken):
+    engine = "arrays"
+
+
+class TestTokenStream(TestToken):
+    # Tiny chunks so most tokens straddle a refill.
+    def new_lexer(self, input):
+        return lexer.StreamLexer(io.StringIO(input), chunk_size=3)
+
+    def assert_same_tokens(self, lex, input, msg=None):
+        expected = lexer.RegexLexer(input)
+        while True:
+            tok = lex.next_token()
+            self.assertEqual(tok, expected.next_token(), msg)
+            self.assertEqual(lex.offset, expected.offset, msg)
+            if tok.token_type == token.EOF and lex.offset == len(input):
+                return
+
+    def test_lexer_stream_chunk_sizes(self):
+        input = example_script + '"a\\" x "b\\\\" y == 123456 café'
+        for chunk_size in range(1, 10):
+            lex = lexer.StreamLexer(io.StringIO(input), chunk_size)
+            self.assert_same_tokens(lex, input, chunk_size)
+            self.assertEqual(lex.lines.line_starts, lexer.LineIndex(input).line_starts)
+
+    def test_lexer_stream_bounded_buffer(self):
+        input = "let x = 1;\n" * 1000 + '"' + "s" * 100 + '"'
+        lex = lexer.StreamLexer(io.StringIO(input), chunk_size=16)
+        longest = 0
+        while lex.next_token().token_type != token.EOF:
+            longest = max(longest, len(lex.input))
+        self.assertLess(longest, 128)
+
+    def test_lexer_stream_utf8_bytes(self):
+        input = 'let é = "✓ ünï"; é'
+        for chunk_size in range(1, 5):
+            lex = lexer.StreamLexer(io.BytesIO(input.encode()), chunk_size)
+            self.assert_same_tokens(lex, input, chunk_size)
+
+    def test_lexer_stream_mmap(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(example_script.encode())
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                lex = lexer.StreamLexer(m, chunk_size=7)
+                self.assert_same_tokens(lex, example_script)
+
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,5 @@
 from unittest import main, TestCase
-from src.monkey import obj
+from src.monkey import builtin, code, obj
 
 
 class TestObj(TestCase):
@@ -23,3 +23,74 @@ class TestObj(TestCase):
         val_obj = obj.Integer(10)
         self.assertNotEqual(hash_obj.pairs[key_obj], val_obj)
         self.assertEqual(hash_obj.inspect, "{hello: 10, not_hello: 9}")
+
+    def test_obj_compiled_function_decoded_cache(self):
+        fn = obj.CompiledFunction(
+            bytearray(code.make(code.OpCode.GetLocal, 0)), n_locals=1, n_params=1
+        )
+        self.assertEqual(fn.decoded, [(code.Op.GetLocal, 0)])
+        self.assertIs(fn.decoded, fn.decoded)
+        self.assertEqual(fn, obj.CompiledFunction(fn.instructions, 1, 1))
+
+    def test_obj_small_int_cache(self):
+        self.assertIs(obj.new_integer(0), obj.new_integer(0))
+        self.assertIs(obj.new_integer(-5), obj.new_integer(-5))
+        self.assertIs(obj.new_integer(1024), obj.new_integer(1024))
+        self.assertIsNot(obj.new_integer(1025), obj.new_integer(1025))
+        self.assertEqual(obj.new_integer(1025), obj.Integer(1025))
+
+        low, high = obj.SMALL_INT_LOW, obj.SMALL_INT_HIGH
+        try:
+            obj.set_small_int_range(0, 2048)
+            self.assertIs(obj.new_integer(2048), obj.new_integer(2048))
+            self.assertIsNot(obj.new_integer(-1), obj.new_integer(-1))
+        finally:
+            obj.set_small_int_range(low, high)
+
+    def test_obj_pvector(self):
+        for n in (0, 1, 32, 33, 1024, 1025, 33 * 32 + 1):
+            items = list(range(n))
+            vec = obj.PVector.from_iterable(items)
+            self.assertEqual(list(vec), items)
+            pushed = obj.PVector()
+            for i in items:
+                pushed = pushed.push(i)
+            self.assertEqual(pushed, items)
+            if n:
+                self.assertEqual(vec[-1], n - 1)
+                self.assertEqual(list(vec.rest()), items[1:])
+                self.assertEqual(list(vec.rest().push(n)), items[1:] + [n])
+            self.assertEqual(list(vec), items)
+
+    def test_obj_array_builtins_share_structure(self):
+        push = builtin.get_builtin_by_name("push")
+        rest = builtin.get_builtin_by_name("rest")
+        arr = obj.Array([])
+        for i in range(100):
+            arr = push.fn(arr, obj.new_integer(i))
+        tail = rest.fn(arr)
+        longer = push.fn(tail, obj.new_integer(100))
+        self.assertEqual(len(arr.elements), 100)
+        self.assertEqual(tail.elements, [obj.new_integer(i) for i in range(1, 100)])
+        self.assertEqual(longer.inspect, "[" + ", ".join(map(str, range(1, 101))) + "]")
+        self.assertEqual(arr, obj.Array([obj.new_integer(i) for i in range(100)]))
+
+    def test_obj_pmap(self):
+        keys = [obj.new_integer(i) for i in range(2000)] + [obj.TRUE, obj.String("1")]
+        pairs = [(k, obj.new_integer(i)) for i, k in enumerate(keys)]
+        built = obj.PMap.from_pairs(pairs)
+        assoced = obj.PMap()
+        for k, v in pairs:
+            assoced = assoced.assoc(k, v)
+        for m in (built, assoced):
+            self.assertEqual(len(m), len(keys))
+            self.assertEqual(list(m.keys()), keys)
+            self.assertEqual(m, dict(pairs))
+            for k, v in pairs:
+                self.assertEqual(m[k], v)
+        self.assertIsNone(built.get(obj.String("missing")))
+
+        updated = built.assoc(keys[0], obj.NULL)
+        self.assertEqual(updated[keys[0]], obj.NULL)
+        self.assertEqual(built[keys[0]], obj.new_integer(0))
+        self.assertEqual(list(updated.keys()), keys)
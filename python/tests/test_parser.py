@@ -77,6 +77,33 @@ class TestParser(TestCase):
             self.assertEqual(stmt.name.value, ident)
             self.assertEqual(stmt.name.token_literal, ident)
 
+    def test_parser_token_arrays(self):
+        code = """
+        let add = fn(a, b) { a + b * -2 };
+        if (add(1, 2) != 3) { [1, "two"] } else { {"three": add}["three"] }
+        """
+        expected = parser.Parser(lexer.Lexer(code)).parse_program()
+        par = parser.Parser(lexer.ArrayLexer(lexer.tokenize_all(code)))
+        program = par.parse_program()
+        self.assertEqual(par.errors, [])
+        self.assertEqual(program.string, expected.string)
+
+    def test_parser_offsets(self):
+        code = "let x = 5;\nadd(x, -y) * 2"
+        par = parser.Parser(lexer.Lexer(code))
+        program = par.parse_program()
+        let, stmt = program.statements
+        self.assertEqual((let.offset, let.name.offset, let.value.offset), (0, 4, 8))
+        infix = stmt.expression
+        call = infix.left
+        self.assertEqual((stmt.offset, infix.offset, infix.right.offset), (11, 22, 24))
+        self.assertEqual((call.offset, call.function.offset), (14, 11))
+        self.assertEqual([a.offset for a in call.arguements], [15, 18])
+
+        par = parser.Parser(lexer.Lexer("let x 5;\nlet = 1;"))
+        par.parse_program()
+        self.assertEqual(par.error_offsets[:2], [6, 13])
+
     def test_parser_errors(self):
         bad_code = ("let x 5;\n"
                     "let = 10;\n"
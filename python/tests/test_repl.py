@@ -0,0 +1,105 @@
+import contextlib
+import io
+import os
+import tempfile
+from unittest import TestCase
+
+from src.monkey import lexer, repl, serial
+
+SCRIPT = """
+let reduce = fn(arr, init, f) {
+    if (len(arr) == 0) { init } else { reduce(rest(arr), f(init, first(arr)), f) }
+};
+let greet = fn() { puts("hello"); };
+greet();
+reduce([1, 2, 3, 4], 0, fn(acc, el) { acc + el });
+"""
+
+
+class ChunkedFile(io.StringIO):
+    """A script file that records how much each read asks for."""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.reads = []
+
+    def read(self, size=-1):
+        self.reads.append(size)
+        return super().read(size)
+
+
+class TestRepl(TestCase):
+    def run_file(self, src_code, mode, path=None):
+        rout = io.StringIO()
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            result = repl.run_file(src_code, mode, path, rout)
+        return result, stdout.getvalue(), rout.getvalue()
+
+    def test_repl_run_file(self):
+        for mode in ("interp", "vm"):
+            result, stdout, errors = self.run_file(SCRIPT, mode)
+            self.assertEqual(errors, "", mode)
+            self.assertEqual(stdout, "hello\n", mode)
+            self.assertEqual(result.inspect, "10", mode)
+
+    def test_repl_run_file_stream(self):
+        for mode in ("interp", "vm"):
+            result, stdout, errors = self.run_file(io.StringIO(SCRIPT), mode)
+            self.assertEqual(errors, "", mode)
+            self.assertEqual(stdout, "hello\n", mode)
+            self.assertEqual(result.inspect, "10", mode)
+
+    def test_repl_run_file_errors(self):
+        tests = [
+            ("let x = 1 +;", "interp", "Parsing Error!"),
+            ("let x = 1 +;", "vm", "Parsing Error!"),
+            ("fn() { y };", "vm", "Failed to Compile!"),
+            ("fn(x) { x }();", "vm", "VM Error!"),
+            ('1 + "a";', "interp", "Runtime Error!"),
+            ("1;", "jit", "unsupported mode: jit"),
+        ]
+        for src_code, mode, expected in tests:
+            result, _, errors = self.run_file(src_code, mode)
+            self.assertIsNone(result)
+            self.assertIn(expected, errors)
+
+    def test_repl_run_file_uses_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "script.mk")
+            result, _, _ = self.run_file(SCRIPT, "vm", path)
+            self.assertEqual(result.inspect, "10")
+            self.assertIsNotNone(serial.read_cache(path, SCRIPT))
+
+            # A valid cache is executed without reparsing the source.
+            cached = SCRIPT.replace("greet();", "greet(;")
+            serial.write_cache(path, cached, serial.read_cache(path, SCRIPT))
+            result, stdout, errors = self.run_file(cached, "vm", path)
+            self.assertEqual(errors, "")
+            self.assertEqual(stdout, "hello\n")
+            self.assertEqual(result.inspect, "10")
+
+    def test_repl_run_file_streams(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "script.mk")
+            f = ChunkedFile(SCRIPT)
+            result, stdout, errors = self.run_file(f, "vm", path)
+            self.assertEqual(errors, "")
+            self.assertEqual(result.inspect, "10")
+            # Hashed and then lexed a chunk at a time, never read whole.
+            self.assertTrue(f.reads)
+            for size in f.reads:
+                self.assertTrue(0 < size <= lexer.DEFAULT_CHUNK_SIZE, size)
+            self.assertIsNotNone(serial.read_cache(path, SCRIPT))
+
+            # A stream is hashed the same way, so its .mkc is found again.
+            f = ChunkedFile(SCRIPT)
+            result, stdout, _ = self.run_file(f, "vm", path)
+            self.assertEqual(stdout, "hello\n")
+            self.assertEqual(result.inspect, "10")
+
+            # Errors from a cached run still get their line.
+            failing = "let x = 1;\nfn(a) { a }();"
+            self.run_file(failing, "vm", path)
+            _, _, errors = self.run_file(ChunkedFile(failing), "vm", path)
+            self.assertIn("line 2, column", errors)
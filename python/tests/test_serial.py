@@ -0,0 +1,87 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from src.monkey import compiler, lexer, obj, parser, serial, vm
+
+
+def compile_source(src_code: str) -> compiler.Bytecode:
+    program = parser.Parser(lexer.Lexer(src_code)).parse_program()
+    comp = compiler.Compiler()
+    comp.compile(program)
+    return comp.bytecode
+
+
+SOURCE = """
+let big = 123456789012345678901234567890;
+let greet = fn(name) { "hello, " + name };
+let adder = fn(a) { fn(b) { a + b - 7 } };
+[adder(10)(-3), greet("monkey"), big, -big];
+"""
+
+
+class TestSerial(TestCase):
+    def test_serial_round_trip(self):
+        bytecode = compile_source(SOURCE)
+        loaded = serial.loads(serial.dumps(bytecode, SOURCE), SOURCE)
+        self.assertEqual(loaded.instructions, bytecode.instructions)
+        self.assertEqual(loaded.constants, bytecode.constants)
+        self.assertEqual(loaded.n_globals, 3)
+        self.assertEqual(loaded.lines, bytecode.lines)
+        self.assertEqual(
+            [c.lines for c in loaded.constants if isinstance(c, obj.CompiledFunction)],
+            [
+                c.lines
+                for c in bytecode.constants
+                if isinstance(c, obj.CompiledFunction)
+            ],
+        )
+        self.assertTrue(
+            any(isinstance(c, obj.CompiledFunction) for c in loaded.constants)
+        )
+
+        machine = vm.VirtualMachine(loaded)
+        machine.run()
+        self.assertEqual(len(machine.errors), 0)
+        self.assertEqual(
+            machine.last_popped.inspect,
+            "[0, hello, monkey, 123456789012345678901234567890, "
+            "-123456789012345678901234567890]",
+        )
+
+    def test_serial_unicode_strings(self):
+        bytecode = compiler.Bytecode(bytearray(), [obj.String("héllo ✓")])
+        loaded = serial.loads(serial.dumps(bytecode))
+        self.assertEqual(loaded.constants, [obj.String("héllo ✓")])
+
+    def test_serial_rejects_bad_data(self):
+        data = serial.dumps(compile_source(SOURCE), SOURCE)
+        tests = [
+            b"",
+            b"XXXX" + data[4:],
+            data[: len(data) // 2],
+        ]
+        for bad in tests:
+            with self.assertRaises(ValueError):
+                serial.loads(bad)
+        with self.assertRaises(ValueError):
+            serial.loads(data, SOURCE + "1;")
+        with self.assertRaises(ValueError):
+            serial.dumps(compiler.Bytecode(bytearray(), [obj.TRUE]))
+
+    def test_serial_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "script.mk")
+            self.assertEqual(serial.cache_path(path), os.path.join(tmp, "script.mkc"))
+            self.assertIsNone(serial.read_cache(path, SOURCE))
+
+            bytecode = compile_source(SOURCE)
+            self.assertTrue(serial.write_cache(path, SOURCE, bytecode))
+            cached = serial.read_cache(path, SOURCE)
+            assert cached is not None
+            self.assertEqual(cached.instructions, bytecode.instructions)
+            self.assertEqual(cached.constants, bytecode.constants)
+
+            # Edited source invalidates the cache.
+            self.assertIsNone(serial.read_cache(path, SOURCE + "1;"))
+            self.assertEqual(os.listdir(tmp), ["script.mkc"])
@@ -0,0 +1,184 @@
+import io
+from unittest import TestCase
+
+from src.monkey import cache, obj, session
+
+
+class TestSession(TestCase):
+    def test_session_keeps_state(self):
+        for mode in session.MODES:
+            sess = session.Session(mode)
+            sess.run("let x = 5;")
+            sess.run("let add = fn(a, b) { a + b };")
+            result = sess.run("add(x, len([1, 2]))")
+            self.assertEqual(sess.errors, [], mode)
+            assert result is not None
+            self.assertEqual(result.inspect, "7", mode)
+
+    def test_session_empty_run(self):
+        sess = session.Session()
+        sess.run("99")
+        self.assertEqual(sess.run(""), obj.NULL)
+
+    def test_session_errors(self):
+        tests = [
+            ("vm", "let x = 1 +;", session.PARSE_STAGE),
+            ("vm", "fn() { y };", session.COMPILE_STAGE),
+            ("vm", "fn(x) { x }();", session.RUNTIME_STAGE),
+            ("interp", "let x = 1 +;", session.PARSE_STAGE),
+            ("interp", '1 + "a";', session.RUNTIME_STAGE),
+        ]
+        for mode, src_code, stage in tests:
+            sess = session.Session(mode)
+            self.assertIsNone(sess.run(src_code))
+            self.assertEqual(sess.error_stage, stage, src_code)
+            self.assertNotEqual(sess.error_str, "", src_code)
+
+            # The next run starts clean.
+            result = sess.run("1")
+            assert result is not None
+            self.assertIsNone(sess.error_stage)
+            self.assertEqual(result.inspect, "1")
+
+    def test_session_runtime_exceptions(self):
+        deep = "let f = fn(n) { if (n == 0) { 0 } else { 1 + f(n - 1) } }; f(5000);"
+        tests = [
+            ("vm", "1 / 0", "division by zero"),
+            ("vm", "let z = 0; 10 / z", "division by zero"),
+            ("vm", deep, "Frame stack overflow."),
+            ("vm", '-"a"', "unknown operator: -STRING"),
+            ("vm", '"a" - "b"', "unknown operator: STRING - STRING"),
+            ("vm", "1 * true", "type mismatch: INTEGER * BOOLEAN"),
+            ("interp", deep, "maximum recursion depth"),
+        ]
+        for mode, src_code, expected in tests:
+            sess = session.Session(mode)
+            self.assertIsNone(sess.run(src_code), src_code)
+            self.assertEqual(sess.error_stage, session.RUNTIME_STAGE, src_code)
+            self.assertIn(expected, sess.error_str, src_code)
+
+            result = sess.run("1")
+            assert result is not None
+            self.assertEqual(result.inspect, "1")
+
+    def test_session_error_locations(self):
+        tests = [
+            ("let x = 1;\nlet = 2;", "line 2, column 5: Expected next token"),
+            ("let x = 1;\n  x + y;", "line 2, column 7: unknown identifier: y"),
+            ("let f = fn(a) { a };\nf();", "line 2, column 2: incorrect number"),
+            # Identical functions each report their own place.
+            (
+                "let a = 1;\n\n\nlet f = fn() { 1 / 0 };\nlet g = fn() { 1 / 0 };\nf()",
+                "line 4, column 18: division by zero",
+            ),
+            (
+                "let a = 1;\n\n\nlet f = fn() { 1 / 0 };\nlet g = fn() { 1 / 0 };\ng()",
+                "line 5, column 18: division by zero",
+            ),
+        ]
+        for src_code, expected in tests:
+            sess = session.Session()
+            self.assertIsNone(sess.run(src_code))
+            self.assertTrue(sess.error_str.startswith(expected), sess.error_str)
+            # A streamed source is reported in the same way.
+            self.assertIsNone(sess.run(io.StringIO(src_code)))
+            self.assertTrue(sess.error_str.startswith(expected), sess.error_str)
+
+    def test_session_error_locations_across_runs(self):
+        for cache_size in (0, 128):
+            sess = session.Session(cache_size=cache_size)
+            define = "let f = fn(x) {\n  x / 0\n};"
+            sess.run(define)
+            # f's line table points into the first run's source, not this one.
+            self.assertIsNone(sess.run("f(1)"))
+            self.assertEqual(sess.error_str, "division by zero")
+            self.assertIsNone(sess.run(io.StringIO("f(1)")))
+            self.assertEqual(sess.error_str, "division by zero")
+            # The same source again is located as before.
+            for _ in range(2):
+                self.assertIsNone(sess.run(define + " f(1)"))
+                self.assertEqual(sess.error_str, "line 2, column 5: division by zero")
+
+    def test_session_compile_error_rolls_back(self):
+        sess = session.Session()
+        sess.run("let a = 1;")
+        n_def = sess.table.n_def
+        n_constants = len(sess.constants)
+
+        a = sess.table.resolve("a")
+
+        self.assertIsNone(sess.run('let b = "x"; let a = 2; missing;'))
+        self.assertEqual(sess.error_stage, session.COMPILE_STAGE)
+        self.assertIsNone(sess.table.resolve("b"))
+        self.assertEqual(sess.table.resolve("a"), a)
+        self.assertEqual(sess.table.n_def, n_def)
+        self.assertEqual(len(sess.constants), n_constants)
+        self.assertEqual(len(sess.constant_index), n_constants)
+
+        result = sess.run('let b = 10; let s = "x"; a + b')
+        assert result is not None
+        self.assertEqual(result.inspect, "11")
+        self.assertEqual(
+            sess.constants[sess.constant_index[(obj.String, "x")]].inspect, "x"
+        )
+
+    def test_session_unsupported_mode(self):
+        with self.assertRaises(ValueError):
+            session.Session("jit")
+
+    def test_session_define(self):
+        for mode in session.MODES:
+            sess = session.Session(mode)
+            sess.define("factor", obj.NULL)
+            sess.run("let scale = fn(x) { x * factor };")
+            for i in range(3):
+                sess.define("factor", obj.Integer(i))
+                result = sess.run("scale(10)")
+                assert result is not None
+                self.assertEqual(result.inspect, str(10 * i), mode)
+
+    def test_session_cache(self):
+        sess = session.Session(cache_size=2)
+        assert sess.cache is not None
+        sess.define("x", obj.Integer(1))
+        for i in range(3):
+            sess.define("x", obj.Integer(i))
+            result = sess.run("x + 1")
+            assert result is not None
+            self.assertEqual(result.inspect, str(i + 1))
+        self.assertEqual((sess.cache.hits, sess.cache.misses), (2, 1))
+
+        # Rebinding x with let gives it a new slot, so the entry is stale.
+        sess.run("let x = 10;")
+        result = sess.run("x + 1")
+        assert result is not None
+        self.assertEqual(result.inspect, "11")
+        self.assertEqual(sess.cache.hits, 2)
+
+    def test_session_cache_replays_definitions(self):
+        sess = session.Session()
+        assert sess.cache is not None
+        sess.run("let f = fn() { 1 };")
+        n_def = sess.table.n_def
+        # Rolled back to the state the entry was compiled in, the next run hits.
+        sess.table.store.pop("f")
+        sess.table.n_def = 0
+        sess.run("let f = fn() { 1 };")
+        self.assertEqual(sess.cache.hits, 1)
+        self.assertEqual(sess.table.n_def, n_def)
+        result = sess.run("f()")
+        assert result is not None
+        self.assertEqual(result.inspect, "1")
+
+    def test_session_cache_eviction(self):
+        sess = session.Session(cache_size=2)
+        assert sess.cache is not None
+        for src_code in ["1", "2", "1", "3", "2"]:
+            sess.run(src_code)
+        # "2" was evicted by "3" after "1" was used again.
+        self.assertEqual((sess.cache.hits, sess.cache.misses), (1, 4))
+        self.assertEqual(list(sess.cache.entries), ["3", "2"])
+
+        self.assertIsNone(session.Session(cache_size=0).cache)
+        with self.assertRaises(ValueError):
+            cache.ProgramCache(0)
@@ -167,3 +167,26 @@ class TestSymbols(TestCase):
 
         self.assertIsNone(lt2.resolve("g"))
         self.assertIsNone(lt2.resolve("h"))
+
+    def test_define_function_name(self):
+        g = symbols.Table()
+        l1 = symbols.Table(g)
+        l1.define_function_name("f")
+        self.assertEqual(
+            l1.resolve("f"), symbols.Symbol("f", symbols.FUNCTION_SCOPE, 0)
+        )
+        self.assertEqual(l1.n_def, 0)
+
+        l2 = symbols.Table(l1)
+        self.assertEqual(l2.resolve("f"), symbols.Symbol("f", symbols.FREE_SCOPE, 0))
+        self.assertEqual(l2.free_sym, [symbols.Symbol("f", symbols.FUNCTION_SCOPE, 0)])
+
+    def test_changed(self):
+        g = symbols.Table()
+        a = g.define("a")
+        g.changed = {}
+        g.define("b")
+        g.define("a")
+        g.define("a")
+        # Only the symbol before the first rebinding is kept.
+        self.assertEqual(g.changed, {"b": None, "a": a})
@@ -1,7 +1,7 @@
 from typing import Any, cast
 from unittest import TestCase
 
-from src.monkey import ast, compiler, lexer, obj, parser, vm, code
+from src.monkey import ast, compiler, fold, lexer, obj, parser, symbols, vm, code
 
 
 def parse(src_code: str) -> ast.Program:
@@ -11,11 +11,22 @@ def parse(src_code: str) -> ast.Program:
 
 
 class TestVirtualMachine(TestCase):
+    def parse(self, src_code: str) -> ast.Program:
+        return parse(src_code)
+
+    def new_compiler(self) -> compiler.Compiler:
+        return compiler.Compiler()
+
+    def new_vm(
+        self, bytecode: compiler.Bytecode, globals: list[obj.Object] | None = None
+    ) -> vm.VirtualMachine:
+        return vm.VirtualMachine(bytecode, globals)
+
     def verify_vm_case(self, src_code: str, expected: Any):
-        program = parse(src_code)
-        comp = compiler.Compiler()
+        program = self.parse(src_code)
+        comp = self.new_compiler()
         comp.compile(program)
-        virt = vm.VirtualMachine(comp.bytecode)
+        virt = self.new_vm(comp.bytecode)
         virt.run()
         self.assertIsNotNone(virt.last_popped)
         self.verify_expected_object(expected, virt.last_popped)
@@ -127,6 +138,18 @@ class TestVirtualMachine(TestCase):
         for src_code, expected in tests:
             self.verify_vm_case(src_code, expected)
 
+    def test_vm_unreachable_code(self):
+        tests = (
+            ("fn() { return 1; 2; }()", 1),
+            ("fn(x) { if (x) { return 1; } else { return 2; }; 3; }(false)", 2),
+            ("fn(x) { if (x) { return 1; }; return 2; 3; }(true)", 1),
+            ("if (true) { if (false) { 1 } else { 2 } } else { 3 }", 2),
+            ("if (false) { 1 } else { if (true) { 2 } }", 2),
+            ("let x = if (false) { 1 }; if (x) { 2 } else { 3 }", 3),
+        )
+        for src_code, expected in tests:
+            self.verify_vm_case(src_code, expected)
+
     def test_vm_let_statements(self):
         tests = (
             ("let one = 1; one;", 1),
@@ -532,3 +555,274 @@ class TestVirtualMachine(TestCase):
         ]
         for src_code, expected in tests:
             self.verify_vm_case(src_code, expected)
+
+    def test_vm_tail_calls(self):
+        # Each of these recurses far deeper than MAX_FRAMES.
+        depth = vm.MAX_FRAMES * 4
+        tests = [
+            [
+                f"""
+                let countDown = fn(x) {{ if (x == 0) {{ 0 }} else {{ countDown(x - 1) }} }};
+                countDown({depth});
+                """,
+                0,
+            ],
+            [
+                f"""
+                let sum = fn(n) {{
+                    let iter = fn(n, acc) {{
+                        if (n == 0) {{ return acc; }}
+                        return iter(n - 1, acc + n);
+                    }};
+                    iter(n, 0);
+                }};
+                sum({depth});
+                """,
+                depth * (depth + 1) // 2,
+            ],
+            [
+                f"""
+                let odd = fn(n, even) {{ if (n == 0) {{ false }} else {{ even(n - 1, odd) }} }};
+                let even = fn(n, odd) {{ if (n == 0) {{ true }} else {{ odd(n - 1, even) }} }};
+                even({depth + 1}, odd);
+                """,
+                False,
+            ],
+            [
+                f"""
+                let map = fn(arr, f) {{
+                    let iter = fn(arr, accum) {{
+                        if (len(arr) == 0) {{ return accum; }}
+                        return iter(rest(arr), push(accum, f(first(arr))));
+                    }};
+                    iter(arr, []);
+                }};
+                let build = fn(n, acc) {{ if (n == 0) {{ acc }} else {{ build(n - 1, push(acc, n)) }} }};
+                len(map(build({depth}, []), fn(x) {{ x * 2 }}));
+                """,
+                depth,
+            ],
+            ["let f = fn(x) { len(x) }; f([1, 2]);", 2],
+        ]
+        for src_code, expected in tests:
+            self.verify_vm_case(src_code, expected)
+
+    def test_vm_call_site_caches(self):
+        tests = [
+            # One call site sees several closures, builtins and a bad arity.
+            [
+                """
+                let apply = fn(f, x) { f(x) };
+                let call = fn(f, x) { let r = f(x); r };
+                [apply(fn(x) { x + 1 }, 1), apply(fn(x) { x * 10 }, 2),
+                 apply(len, "abc"), apply(first, [7]),
+                 call(fn(x) { x - 1 }, 1), call(len, [1, 2]), call(fn(x) { x }, 5)]
+                """,
+                [2, 20, 3, 7, 0, 2, 5],
+            ],
+            # Rebinding a global slot between calls through the same site.
+            [
+                """
+                let f = fn() { 1 };
+                let g = fn() { f() };
+                let a = g();
+                let h = fn(f) { f() };
+                [a, h(fn() { 2 }), g(), h(len)]
+                """,
+                [1, 2, 1, obj.Error("wrong number of arguements. got=0, want=1")],
+            ],
+        ]
+        for src_code, expected in tests:
+            self.verify_vm_case(src_code, expected)
+
+        # Rebind f's slot in between runs, as a later REPL line could.
+        constants: list[obj.Object] = []
+        table = symbols.Table()
+        globals = vm.build_new_globals()
+        results = []
+        for line in ["let f = fn() { 1 }; let g = fn() { f() }; g();", "g();"]:
+            comp = compiler.Compiler(constants, table)
+            comp.compile(self.parse(line))
+            virt = self.new_vm(comp.bytecode, globals)
+            virt.run()
+            results.append(virt.last_popped)
+            globals[table.resolve("f").index] = obj.BuiltIn(lambda: obj.Integer(42))
+        self.assertEqual(results, [obj.Integer(1), obj.Integer(42)])
+
+        # Sites keep the function, not the closure and its free variables.
+        comp = self.new_compiler()
+        comp.compile(self.parse("let k = fn(a) { fn() { a } }; k([1, 2])();"))
+        bytecode = comp.bytecode
+        self.new_vm(bytecode).run()
+        cells = [ins[-1] for ins in bytecode.main_fn.decoded if ins[0] in code.CallOps]
+        self.assertEqual(len(cells), 2)
+        for cell in cells:
+            self.assertNotIsInstance(cell[0], obj.Closure)
+
+    def test_vm_globals_store(self):
+        comp = self.new_compiler()
+        comp.compile(self.parse("let a = 1; let b = a + 1; b;"))
+        bytecode = comp.bytecode
+        self.assertEqual(bytecode.n_globals, 2)
+
+        first = self.new_vm(bytecode)
+        first.run()
+        self.assertEqual(first.globals, [obj.Integer(1), obj.Integer(2)])
+        # VMs without an explicit store don't see each other's globals.
+        comp = self.new_compiler()
+        comp.compile(self.parse("let c = 3; c;"))
+        second = self.new_vm(comp.bytecode)
+        second.run()
+        self.assertEqual(second.globals, [obj.Integer(3)])
+        self.assertEqual(first.globals, [obj.Integer(1), obj.Integer(2)])
+
+        # A shared store grows as later programs define more globals.
+        constants: list[obj.Object] = []
+        table = symbols.Table()
+        globals = vm.build_new_globals()
+        for line, n_globals in [("let x = 1;", 1), ("let y = x + 1; y", 2)]:
+            comp = compiler.Compiler(constants, table)
+            comp.compile(self.parse(line))
+            virt = self.new_vm(comp.bytecode, globals)
+            virt.run()
+            self.assertEqual(len(globals), n_globals)
+        self.assertEqual(virt.last_popped, obj.Integer(2))
+
+    def test_vm_hand_built_bytecode_globals(self):
+        # Without n_globals the store is sized from the global ops, including
+        # those in functions.
+        fn = obj.CompiledFunction(
+            code.make(code.OpCode.GetGlobal, 3) + code.make(code.OpCode.ReturnValue),
+            0,
+            0,
+        )
+        insts = [
+            code.make(code.OpCode.PConstant, 0),
+            code.make(code.OpCode.SetGlobal, 3),
+            code.make(code.OpCode.Closure, 1, 0),
+            code.make(code.OpCode.Call, 0),
+            code.make(code.OpCode.Pop),
+        ]
+        bytecode = compiler.Bytecode(bytearray(b"".join(insts)), [obj.Integer(7), fn])
+        virt = self.new_vm(bytecode)
+        virt.run()
+        self.assertEqual(virt.errors, [])
+        self.assertEqual(len(virt.globals), 4)
+        self.assertEqual(virt.last_popped, obj.Integer(7))
+
+    def test_vm_reset(self):
+        programs = [
+            ("let a = [1, 2, 3]; a[2]", 3),
+            ("let f = fn(n) { if (n == 0) { 0 } else { 1 + f(n - 1) } }; f(50)", 50),
+            ("1 + 1", 2),
+            # Nothing popped, so not the last program's result.
+            ("", None),
+        ]
+        virt = None
+        stack = None
+        for src_code, expected in programs:
+            comp = self.new_compiler()
+            comp.compile(self.parse(src_code))
+            if virt is None:
+                virt = self.new_vm(comp.bytecode)
+                stack = virt.stack
+            else:
+                virt.reset(comp.bytecode)
+                # Nothing from the last run is kept alive.
+                self.assertTrue(all(o is obj.NULL for o in virt.stack))
+            virt.run()
+            self.assertEqual(virt.errors, [])
+            self.assertEqual(virt.fp, 1)
+            self.verify_expected_object(expected, virt.last_popped)
+        assert virt is not None
+        # The stack grew for the recursion and was kept for the last run.
+        self.assertIs(virt.stack, stack)
+        self.assertGreater(len(virt.stack), 50)
+        # Only the part small runs use is cleared on reset.
+        self.assertLess(virt.high_water, 50)
+
+    def test_vm_reuses_main_function(self):
+        comp = self.new_compiler()
+        comp.compile(self.parse("let a = [1, 2, 3]; a[1] + a[2]"))
+        bytecode = comp.bytecode
+        virt = self.new_vm(bytecode)
+        virt.run()
+        decoded = bytecode.main_fn.decoded
+        for _ in range(2):
+            virt.reset(bytecode)
+            virt.run()
+            self.verify_expected_object(5, virt.last_popped)
+            self.assertIs(virt.curr_frame.cl.fn, bytecode.main_fn)
+            self.assertIs(bytecode.main_fn.decoded, decoded)
+
+    def test_vm_calling_with_wrong_arguments(self):
+        tests = [
+            ["fn() { 1; }(1);", "incorrect number of args"],
+            ["fn(a) { a; }();", "incorrect number of args"],
+            ["fn(a, b) { a + b; }(1);", "incorrect number of args"],
+            ["let f = fn(a) { a; }; fn() { f(); }();", "incorrect number of args"],
+            ["let z = 0; 1 / z;", "division by zero"],
+            ["fn(a) { 10 / a; }(0);", "division by zero"],
+            ['-"a";', "unknown operator: -STRING"],
+            ['"a" * 2;', "type mismatch: STRING * INTEGER"],
+            ["true > false;", "unknown operator: BOOLEAN > BOOLEAN"],
+            ['fn(a) { a - 1; }("x");', "type mismatch: STRING - INTEGER"],
+            ['let z = "0"; 1 / z;', "type mismatch: INTEGER / STRING"],
+        ]
+        for src_code, expected in tests:
+            comp = self.new_compiler()
+            comp.compile(self.parse(src_code))
+            virt = self.new_vm(comp.bytecode)
+            virt.run()
+            self.assertEqual(virt.error_str, expected)
+
+    def test_vm_error_offsets(self):
+        tests = [
+            ("fn() { 1; }(1);", 11),
+            ("let x = 1;\nfn(a) { a; }();", 23),
+            ("let f = fn(a) { a; }; fn() { f(); }();", 30),
+            ("let f = fn(a) { a; };\nlet g = fn() { let y = f(); y };\ng();", 46),
+        ]
+        for src_code, offset in tests:
+            comp = self.new_compiler()
+            comp.compile(self.parse(src_code))
+            virt = self.new_vm(comp.bytecode)
+            virt.run()
+            self.assertEqual(len(virt.errors), 1, src_code)
+            self.assertEqual(virt.errors[0].offset, offset, src_code)
+
+
+class TestVirtualMachineTableDispatch(TestVirtualMachine):
+    def new_vm(
+        self, bytecode: compiler.Bytecode, globals: list[obj.Object] | None = None
+    ) -> vm.VirtualMachine:
+        return vm.VirtualMachine(bytecode, globals, dispatch="table")
+
+    def test_vm_handlers_cover_opdefs(self):
+        for op in code.OpDefs:
+            self.assertIsNot(vm.HANDLERS[op.value[0]], vm.unknown_opcode, op.name)
+
+
+class TestVirtualMachineSuperInstructions(TestVirtualMachine):
+    def new_compiler(self) -> compiler.Compiler:
+        return compiler.Compiler(superinstructions=True)
+
+
+class TestVirtualMachineTableDispatchSuperInstructions(TestVirtualMachineTableDispatch):
+    def new_compiler(self) -> compiler.Compiler:
+        return compiler.Compiler(superinstructions=True)
+
+
+class TestVirtualMachineFolded(TestVirtualMachine):
+    def parse(self, src_code: str) -> ast.Program:
+        return fold.fold(parse(src_code))
+
+
+class TestVirtualMachineOptimized(TestVirtualMachine):
+    def new_compiler(self) -> compiler.Compiler:
+        return compiler.Compiler(optimize=True)
+
+
+class TestVirtualMachineOptimizedSuperInstructions(TestVirtualMachine):
+    def new_compiler(self) -> compiler.Compiler:
+        return compiler.Compiler(optimize=True, superinstructions=True)